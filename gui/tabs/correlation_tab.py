@@ -4,6 +4,7 @@
 Матрица корреляций и heatmap
 """
 
+import heapq
 import tkinter as tk
 from tkinter import ttk
 import matplotlib.pyplot as plt
@@ -233,7 +234,7 @@ class CorrelationTab:
                     rolling_corr = data[target_var].rolling(window=window_size).corr(data[col])
                     stabilities.append((col, rolling_corr.std()))
         
-        return sorted(stabilities, key=lambda x: x[1], reverse=True)[:8]
+        return heapq.nlargest(8, stabilities, key=lambda x: x[1])
     
     def _find_volatile_correlation_pairs(self, data, window_size):
         """Найти самые изменчивые корреляционные пары"""
@@ -249,7 +250,7 @@ class CorrelationTab:
                 if not np.isnan(volatility):
                     volatile_pairs.append((col1, col2, volatility))
         
-        return sorted(volatile_pairs, key=lambda x: x[2], reverse=True)[:6]
+        return heapq.nlargest(6, volatile_pairs, key=lambda x: x[2])
     
     def _show_clustering(self):
         """Показать кластеризацию переменных"""
@@ -259,12 +259,16 @@ class InstrumentsTabWorking(ttk.Frame):
         item = selection[0]
         values = self.search_tree.item(item, 'values')
         ticker = values[0]
+        figi = values[6] if len(values) > 6 else ''  # FIGI в 7-й колонке
         
         try:
-            # Используем правильный метод поиска
-            results_df = self.service.search_instruments_dataframe(ticker)
-            if not results_df.empty:
-                figi = results_df.iloc[0]['FIGI']
+            # FIGI уже есть в строке результатов; иначе берем первое совпадение
+            # из сырого поиска без построения DataFrame
+            if not figi:
+                instrument = next((i for i in self.service.find_instrument(ticker)
+                                   if i.ticker == ticker), None)
+                figi = instrument.figi if instrument else ''
+            if figi:
                 self.show_instrument_details_by_figi(figi)
         except Exception as e:
             messagebox.showerror("Ошибка", f"Не удалось получить детали: {e}")
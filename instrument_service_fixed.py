@@ -1,34 +1,30 @@
 import os
 from datetime import datetime, timedelta
-from tinkoff.invest import Client, InstrumentStatus, InstrumentIdType
+from operator import attrgetter
 import pandas as pd
 
+from tbank_api.instrument_service import InstrumentService
 
-class InstrumentServiceFixed:
-    """Исправленный сервис инструментов с обработкой ошибок"""
-    
-    def __init__(self, token=None):
-        self.token = token
+
+# Популярные российские акции
+POPULAR_RU_TICKERS = frozenset({'SBER', 'GAZP', 'LKOH', 'ROSN', 'YNDX', 'VTBR', 'TATN',
+                                'GMKN', 'PLZL', 'NLMK', 'POLY', 'AFKS', 'PHOR', 'MTSS'})
+
+# Поля результата поиска, читаемые одним вызовом attrgetter
+_SEARCH_FIELDS = ('ticker', 'name', 'instrument_type', 'currency', 'figi')
+_get_search_fields = attrgetter(*_SEARCH_FIELDS)
+
+
+class InstrumentServiceFixed(InstrumentService):
+    """Исправленный сервис инструментов с обработкой ошибок
     
-    def _get_client(self):
-        return Client(self.token)
+    Клиент, кэш справочников и поиск наследуются от InstrumentService
+    """
     
     def get_shares_safe(self):
         """Безопасное получение акций с обработкой ошибок"""
         try:
-            with self._get_client() as client:
-                # Пробуем разные подходы
-                try:
-                    shares = client.instruments.shares().instruments
-                    return shares
-                except Exception as e:
-                    print(f"⚠️ Ошибка при обычном запросе: {e}")
-                    # Пробуем альтернативный метод
-                    shares = client.instruments.shares(
-                        instrument_status=InstrumentStatus.INSTRUMENT_STATUS_BASE
-                    ).instruments
-                    return shares
-                    
+            return self.get_all_shares()
         except Exception as e:
             print(f"❌ Критическая ошибка: {e}")
             return []
@@ -39,14 +35,10 @@ class InstrumentServiceFixed:
             shares = self.get_shares_safe()
             popular_data = []
             
-            # Список популярных тикеров
-            popular_tickers = ['SBER', 'GAZP', 'LKOH', 'ROSN', 'YNDX', 'VTBR', 'TATN', 
-                              'GMKN', 'PLZL', 'NLMK', 'POLY', 'AFKS', 'PHOR', 'MTSS']
-            
             for share in shares:
                 try:
                     ticker = getattr(share, 'ticker', '')
-                    if ticker in popular_tickers:
+                    if ticker in POPULAR_RU_TICKERS:
                         popular_data.append({
                             'Ticker': ticker,
                             'Name': getattr(share, 'name', ''),
@@ -71,44 +63,34 @@ class InstrumentServiceFixed:
     def search_instruments_safe(self, query):
         """Безопасный поиск инструментов"""
         try:
-            with self._get_client() as client:
-                result = client.instruments.find_instrument(query=query)
-                
-                instruments_data = []
-                for instrument in result.instruments:
-                    try:
-                        instruments_data.append({
-                            'Ticker': getattr(instrument, 'ticker', ''),
-                            'Name': getattr(instrument, 'name', ''),
-                            'Type': getattr(instrument, 'instrument_type', ''),
-                            'Currency': getattr(instrument, 'currency', ''),
-                            'FIGI': getattr(instrument, 'figi', '')
-                        })
-                    except:
-                        continue
-                
-                return pd.DataFrame(instruments_data)
-                
+            instruments_data = []
+            for instrument in self.find_instrument(query):
+                try:
+                    instruments_data.append(_get_search_fields(instrument))
+                except AttributeError:
+                    continue
+            
+            return pd.DataFrame.from_records(
+                instruments_data, columns=['Ticker', 'Name', 'Type', 'Currency', 'FIGI'])
+            
         except Exception as e:
             print(f"❌ Ошибка поиска: {e}")
             return pd.DataFrame()
 
 
 # Тестирование
-if __name__ == "__main__":
-    from config import Config
-    TOKEN = Config.TINKOFF_TOKEN
-    
-    service = InstrumentServiceFixed(TOKEN)
+if __name__ == "__main__" and os.getenv('TBANK_SMOKE'):
+    # Смоук-тест с живыми запросами к API: TBANK_SMOKE=1 TBANK_TOKEN=... python instrument_service_fixed.py
+    service = InstrumentServiceFixed(os.environ['TBANK_TOKEN'])
     
     print("🔧 Тестирование исправленного сервиса...")
     
     # Тест популярных акций
     popular = service.get_popular_russian_shares_fixed()
     print(f"📈 Популярные акции: {len(popular)}")
-    print(popular)
+    print(popular.to_string())
     
     # Тест поиска
     search_results = service.search_instruments_safe("SBER")
     print(f"🔍 Результаты поиска: {len(search_results)}")
-    print(search_results)
\ No newline at end of file
+    print(search_results.to_string())
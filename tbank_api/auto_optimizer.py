@@ -4,6 +4,8 @@
 """
 
 import json
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, fields
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, Any, List
@@ -11,6 +13,30 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Минимальный интервал между автоматическими оптимизациями
+OPTIMIZATION_INTERVAL = timedelta(hours=12)
+
+@dataclass(slots=True)
+class OptimizationSettings:
+    """Параметры автооптимизации (поля вместо ключей словаря)"""
+    
+    optimization_enabled: bool = True
+    auto_cleanup_enabled: bool = True
+    cleanup_threshold_mb: int = 1000
+    ttl_optimization: bool = True
+    performance_monitoring: bool = True
+    optimization_schedule: str = 'daily'
+    min_hit_ratio_for_cleanup: int = 30
+    max_cache_size_mb: int = 2000
+    
+    @classmethod
+    def from_dict(cls, values: Dict[str, Any]) -> 'OptimizationSettings':
+        """Создание из словаря; неизвестные ключи игнорируются"""
+        return cls(**{key: value for key, value in values.items() if key in _SETTINGS_FIELDS})
+
+# Имена полей настроек - для фильтрации ключей из JSON и update_config
+_SETTINGS_FIELDS = frozenset(field.name for field in fields(OptimizationSettings))
+
 class AutoOptimizer:
     """Автоматическая оптимизация параметров системы"""
     
@@ -22,47 +48,61 @@ class AutoOptimizer:
         # Загружаем конфигурацию
         self.config = self._load_config()
         self.last_optimization = None
+        # Несохраненные изменения и глубина вложенных транзакций
+        self._dirty = False
+        self._batch_depth = 0
         
-    def _load_config(self) -> Dict[str, Any]:
+    def _load_config(self) -> OptimizationSettings:
         """Загрузка конфигурации оптимизации"""
-        default_config = {
-            'optimization_enabled': True,
-            'auto_cleanup_enabled': True,
-            'cleanup_threshold_mb': 1000,
-            'ttl_optimization': True,
-            'performance_monitoring': True,
-            'optimization_schedule': 'daily',
-            'min_hit_ratio_for_cleanup': 30,
-            'max_cache_size_mb': 2000
-        }
-        
         try:
             if self.config_path.exists():
                 with open(self.config_path, 'r', encoding='utf-8') as f:
-                    loaded_config = json.load(f)
-                    return {**default_config, **loaded_config}
+                    return OptimizationSettings.from_dict(json.load(f))
         except Exception as e:
             logger.error(f"Ошибка загрузки конфигурации: {e}")
         
-        return default_config
+        return OptimizationSettings()
     
     def save_config(self):
         """Сохранение конфигурации"""
         try:
             with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=2, ensure_ascii=False)
+                json.dump(asdict(self.config), f, indent=2, ensure_ascii=False)
+            self._dirty = False
             logger.info("✅ Конфигурация оптимизации сохранена")
         except Exception as e:
             logger.error(f"Ошибка сохранения конфигурации: {e}")
     
+    def flush(self):
+        """Запись конфигурации, только если есть несохраненные изменения"""
+        if self._dirty:
+            self.save_config()
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Пакетное изменение конфигурации
+        
+        Внутри блока update_config только накапливает изменения,
+        файл записывается один раз при выходе из внешнего блока.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.flush()
+    
     def optimize_cache_parameters(self):
         """Автоматическая оптимизация параметров кэша"""
-        if not self.config['optimization_enabled']:
+        if not self.config.optimization_enabled:
             return
         
         # Проверяем когда была последняя оптимизация
+        now = datetime.now()
         if (self.last_optimization and 
-            (datetime.now() - self.last_optimization).hours < 12):
+            now - self.last_optimization < OPTIMIZATION_INTERVAL):
             return
             
         try:
@@ -75,15 +115,15 @@ class AutoOptimizer:
             optimization_actions = []
             
             # Оптимизация на основе hit ratio
-            if self.config['ttl_optimization']:
+            if self.config.ttl_optimization:
                 ttl_action = self._optimize_based_on_hit_ratio(hit_ratio)
                 if ttl_action:
                     optimization_actions.append(ttl_action)
             
             # Автоочистка при большом размере кэша
-            if (self.config['auto_cleanup_enabled'] and 
-                cache_size > self.config['cleanup_threshold_mb'] and
-                hit_ratio < self.config['min_hit_ratio_for_cleanup']):
+            if (self.config.auto_cleanup_enabled and 
+                cache_size > self.config.cleanup_threshold_mb and
+                hit_ratio < self.config.min_hit_ratio_for_cleanup):
                 cleanup_action = self._perform_auto_cleanup()
                 if cleanup_action:
                     optimization_actions.append(cleanup_action)
@@ -91,7 +131,7 @@ class AutoOptimizer:
             # Логируем оптимизации
             if optimization_actions:
                 self._log_optimization(optimization_actions, analytics)
-                self.last_optimization = datetime.now()
+                self.last_optimization = now
                 
         except Exception as e:
             logger.error(f"Ошибка оптимизации параметров: {e}")
@@ -129,7 +169,7 @@ class AutoOptimizer:
             # Логируем действие
             return {
                 'type': 'auto_cleanup',
-                'reason': f'Размер кэша превысил {self.config["cleanup_threshold_mb"]} MB',
+                'reason': f'Размер кэша превысил {self.config.cleanup_threshold_mb} MB',
                 'size_before_mb': stats_before.get('total_cache_size_mb', 0),
                 'timestamp': datetime.now().isoformat()
             }
@@ -166,6 +206,15 @@ class AutoOptimizer:
     
     def update_config(self, new_config: Dict[str, Any]):
         """Обновление конфигурации"""
-        self.config.update(new_config)
-        self.save_config()
+        changes = {key: value for key, value in new_config.items()
+                   if key in _SETTINGS_FIELDS and getattr(self.config, key) != value}
+        if not changes:
+            return
+        
+        for key, value in changes.items():
+            setattr(self.config, key, value)
+        self._dirty = True
+        # Вне транзакции изменения записываются сразу, как и раньше
+        if self._batch_depth == 0:
+            self.flush()
         logger.info("✅ Конфигурация оптимизации обновлена")
\ No newline at end of file
@@ -17,7 +17,9 @@ class CacheConfig:
     base_cache_dir: Path = Path("tbank_api/data_cache")
     instruments_cache_dir: Path = base_cache_dir / "instruments"
     candles_cache_dir: Path = base_cache_dir / "candles"
+    candles_dataset_dir: Path = candles_cache_dir / "dataset"  # figi=/timeframe=/year=/month=
     metadata_dir: Path = base_cache_dir / "metadata"
+    metadata_db_path: Path = metadata_dir / "meta.db"  # Реестр метаданных всех записей кэша
     
     # Время жизни кэша
     instruments_ttl: timedelta = timedelta(hours=24)  # 24 часа для инструментов
@@ -26,16 +28,24 @@ class CacheConfig:
     
     # Настройки файлов
     file_extension: str = ".parquet"  # Используем parquet для эффективности
-    compression: str = "snappy"
+    compression: str = "zstd"
+    candles_compression: str = "zstd"  # Свечи - числовые колонки, zstd сжимает их заметно лучше
+    compression_level: int = 3         # Уровень zstd: сжатие заметно лучше snappy при сравнимой скорости
+    parquet_page_size: int = 1 << 20   # Размер страницы данных parquet (байты)
+    use_arrow_io: bool = True          # Читать/писать свечи напрямую через pyarrow
+    use_candles_dataset: bool = True   # Хранить свечи секционированным датасетом вместо файла на период
     
     # Лимиты
     max_candle_files_per_instrument: int = 100
+    memory_cache_max_entries: int = 32                        # Справочников в памяти (LRU)
+    stats_refresh_interval: timedelta = timedelta(minutes=1)  # Как часто пересчитывать файлы кэша
     cache_enabled: bool = True
     
     def __post_init__(self):
         """Создание директорий при инициализации"""
         self.instruments_cache_dir.mkdir(parents=True, exist_ok=True)
         self.candles_cache_dir.mkdir(parents=True, exist_ok=True)
+        self.candles_dataset_dir.mkdir(parents=True, exist_ok=True)
         self.metadata_dir.mkdir(parents=True, exist_ok=True)
     
     def get_instrument_cache_path(self, instrument_type: str = "all") -> Path:
@@ -48,6 +58,11 @@ class CacheConfig:
         filename = f"{safe_figi}_{timeframe}_{date_str}{self.file_extension}"
         return self.candles_cache_dir / filename
     
+    def get_candles_dataset_path(self, figi: str, timeframe: str) -> Path:
+        """Каталог секций датасета свечей инструмента и таймфрейма"""
+        safe_figi = figi.replace("/", "_")
+        return self.candles_dataset_dir / f"figi={safe_figi}" / f"timeframe={timeframe}"
+    
     def get_metadata_path(self, key: str) -> Path:
         """Путь к файлу метаданных"""
         return self.metadata_dir / f"{key}.json"
\ No newline at end of file
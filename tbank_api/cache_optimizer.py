@@ -31,19 +31,22 @@ class SafeCacheOptimizer:
             if not result.index.is_monotonic_increasing:
                 result = result.sort_index()
             
-            # 3. Оптимизация числовых типов (осторожно)
-            for col in result.select_dtypes(include=[np.float64]).columns:
-                # Проверяем, что преобразование безопасно
-                if result[col].notna().all():
-                    try:
-                        # Пробуем преобразовать во float32
-                        test_values = result[col].astype(np.float32)
-                        # Проверяем, что не потеряли точность
-                        if np.allclose(result[col].values, test_values.values, rtol=1e-6):
-                            result[col] = test_values
-                            logger.debug(f"✅ Оптимизирован столбец {col} -> float32")
-                    except Exception as e:
-                        logger.warning(f"Не удалось оптимизировать {col}: {e}")
+            # 3. Оптимизация числовых типов (осторожно): все подходящие колонки
+            # приводятся к float32 одним вызовом, чтобы данные остались одним блоком
+            float_cols = [col for col in result.select_dtypes(include=[np.float64]).columns
+                          if result[col].notna().all()]
+            if float_cols:
+                try:
+                    original_values = result[float_cols].to_numpy()
+                    test_values = original_values.astype(np.float32)
+                    # Проверяем, что не потеряли точность (по каждой колонке)
+                    safe = np.isclose(original_values, test_values, rtol=1e-6).all(axis=0)
+                    safe_cols = [col for col, ok in zip(float_cols, safe) if ok]
+                    if safe_cols:
+                        result = result.astype({col: np.float32 for col in safe_cols})
+                        logger.debug(f"✅ Оптимизированы столбцы {safe_cols} -> float32")
+                except Exception as e:
+                    logger.warning(f"Не удалось оптимизировать {float_cols}: {e}")
             
             logger.info(f"✅ Данные оптимизированы: {len(result)} записей")
             return result
@@ -52,6 +55,35 @@ class SafeCacheOptimizer:
             logger.error(f"❌ Ошибка оптимизации данных: {e}")
             return df  # Возвращаем оригинал при ошибке
     
+    @staticmethod
+    def is_already_optimized(df: pd.DataFrame) -> bool:
+        """
+        Данные уже в оптимальном виде: без float64, индекс уникален и отсортирован
+        """
+        return (not df.dtypes.eq(np.float64).any()
+                and df.index.is_unique
+                and df.index.is_monotonic_increasing)
+    
+    @staticmethod
+    def frame_size_mb(df: pd.DataFrame) -> float:
+        """
+        Размер DataFrame в MB; глубокий обход только при наличии нечисловых колонок
+        """
+        deep = not all(pd.api.types.is_numeric_dtype(dtype) for dtype in df.dtypes)
+        return df.memory_usage(deep=deep).sum() / 1024 / 1024
+    
+    @staticmethod
+    def estimate_savings_mb(original_df: pd.DataFrame, optimized_df: pd.DataFrame) -> float:
+        """
+        Оценка экономии памяти по смене типов колонок без обхода данных
+        """
+        saved = sum(
+            (original_df[col].dtype.itemsize - optimized_df[col].dtype.itemsize) * len(optimized_df)
+            for col in optimized_df.columns
+            if col in original_df.columns and original_df[col].dtype != optimized_df[col].dtype
+        )
+        return saved / 1024 / 1024
+    
     @staticmethod
     def get_size_reduction_stats(original_df: pd.DataFrame, optimized_df: pd.DataFrame) -> Dict[str, Any]:
         """Статистика сокращения размера"""
@@ -3,34 +3,147 @@
 Система предзагрузки и прогнозирования запросов
 """
 
-from datetime import datetime, time
+import array
+from datetime import datetime, time, timedelta
 import threading
-from collections import deque
+from collections import OrderedDict
 import heapq
 import logging
+from operator import itemgetter
 from typing import List, Tuple, Dict
 
 logger = logging.getLogger(__name__)
 
+# Параметры count-min sketch (TinyLFU): 4 ряда по 4096 16-битных счетчиков = 32 КиБ
+_CMS_WIDTH = 4096
+_CMS_MAX = 0xFFFF
+# Нечетные множители хеширования, по одному на ряд sketch: индекс ряда -
+# старшие биты 64-битного произведения hash(key) на множитель
+_CMS_MULTIPLIERS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93)
+_CMS_DEPTH = len(_CMS_MULTIPLIERS)
+_HASH_MASK = (1 << 64) - 1
+_CMS_SHIFT = 64 - (_CMS_WIDTH.bit_length() - 1)
+# Размер ограниченного набора кандидатов в популярные инструменты
+_MAX_CANDIDATES = 64
+# Ночное окно предзагрузки
+_PRELOAD_WINDOW = (time(2, 0), time(5, 0))
+# Размер LRU недавних обращений
+_LRU_SIZE = 1000
+
 class CachePredictor:
     """Предсказывает и предзагружает данные"""
     
     def __init__(self, cache_manager):
         self.cache_manager = cache_manager
-        self.access_pattern = deque(maxlen=1000)
+        # LRU недавних обращений: самые свежие ключи в конце
+        self._lru = OrderedDict()
+        # Ограниченный набор кандидатов: ключ -> оценка частоты из sketch
         self.popular_symbols = {}
+        self._cms = [array.array('H', bytes(2 * _CMS_WIDTH)) for _ in range(_CMS_DEPTH)]
+        self._doorkeeper = bytearray(_CMS_WIDTH)
         self.preload_thread = None
         self.running = False
+        self._stop_event = threading.Event()
+        # Защищает sketch, кандидатов и LRU
+        self._lock = threading.Lock()
         
     def record_access(self, symbol: str, timeframe: str):
         """Записывает обращение к данным"""
         key = (symbol, timeframe)
-        self.access_pattern.append(key)
-        self.popular_symbols[key] = self.popular_symbols.get(key, 0) + 1
+        
+        with self._lock:
+            self._touch_recent(key)
+            estimate = self._increment_frequency(key)
+            self._admit_candidate(key, estimate)
+    
+    def _touch_recent(self, key: Tuple[str, str]):
+        """Отмечает ключ как последний использованный в LRU"""
+        self._lru[key] = None
+        self._lru.move_to_end(key)
+        if len(self._lru) > _LRU_SIZE:
+            self._lru.popitem(last=False)
+    
+    def recent_keys(self, top_n: int = None) -> List[Tuple[str, str]]:
+        """Возвращает недавно запрошенные инструменты, начиная с самых свежих"""
+        with self._lock:
+            return self._recent_keys(top_n)
+    
+    def _recent_keys(self, top_n: int = None) -> List[Tuple[str, str]]:
+        """Недавние инструменты, начиная с самых свежих (под self._lock)"""
+        keys = list(reversed(self._lru))
+        return keys if top_n is None else keys[:top_n]
+    
+    @staticmethod
+    def _sketch_indexes(key: Tuple[str, str]) -> Tuple[int, ...]:
+        """Индексы ключа в каждом ряду count-min sketch (один hash(key) на все ряды)"""
+        h = hash(key) & _HASH_MASK
+        return tuple(((h * multiplier) & _HASH_MASK) >> _CMS_SHIFT for multiplier in _CMS_MULTIPLIERS)
+    
+    def _counters(self, indexes: Tuple[int, ...]) -> List[int]:
+        """Счетчики ключа по рядам sketch"""
+        return [row[i] for row, i in zip(self._cms, indexes)]
+    
+    def _increment_frequency(self, key: Tuple[str, str]) -> int:
+        """Увеличивает счетчики ключа и возвращает оценку его частоты"""
+        indexes = self._sketch_indexes(key)
+        doorkeeper = self._doorkeeper
+        
+        # Doorkeeper: первое обращение отмечается только в bloom-фильтре
+        if not all(doorkeeper[i] for i in indexes):
+            for i in indexes:
+                doorkeeper[i] = 1
+            return min(self._counters(indexes)) + 1
+        
+        counters = self._counters(indexes)
+        if max(counters) >= _CMS_MAX:
+            self._age_sketch()
+            counters = self._counters(indexes)
+        
+        for row, i, count in zip(self._cms, indexes, counters):
+            row[i] = count + 1
+        return min(counters) + 2
+    
+    def _estimate_frequency(self, key: Tuple[str, str]) -> int:
+        """Оценка частоты обращений к ключу"""
+        indexes = self._sketch_indexes(key)
+        estimate = min(self._counters(indexes))
+        return estimate + 1 if all(self._doorkeeper[i] for i in indexes) else estimate
+    
+    def _age_sketch(self):
+        """Старение sketch при переполнении счетчиков (сброс TinyLFU)"""
+        self._cms = [array.array('H', [count >> 1 for count in row]) for row in self._cms]
+        self._doorkeeper = bytearray(_CMS_WIDTH)
+        self.popular_symbols = {key: self._estimate_frequency(key) for key in self.popular_symbols}
+    
+    def _admit_candidate(self, key: Tuple[str, str], estimate: int):
+        """Допускает ключ в набор кандидатов, вытесняя наименее популярный"""
+        if key in self.popular_symbols or len(self.popular_symbols) < _MAX_CANDIDATES:
+            self.popular_symbols[key] = estimate
+            return
+        
+        victim = min(self.popular_symbols, key=self.popular_symbols.get)
+        if estimate > self.popular_symbols[victim]:
+            del self.popular_symbols[victim]
+            self.popular_symbols[key] = estimate
         
     def get_popular_symbols(self, top_n: int = 10) -> List[Tuple[Tuple[str, str], int]]:
         """Возвращает самые популярные инструменты"""
-        return heapq.nlargest(top_n, self.popular_symbols.items(), key=lambda x: x[1])
+        with self._lock:
+            return self._popular_symbols(top_n)
+    
+    def _popular_symbols(self, top_n: int) -> List[Tuple[Tuple[str, str], int]]:
+        """Самые популярные инструменты (под self._lock)"""
+        # Набор кандидатов ограничен, а itemgetter работает на уровне C без лямбды
+        return heapq.nlargest(top_n, self.popular_symbols.items(), key=itemgetter(1))
+    
+    def get_preload_candidates(self, top_n: int = 3) -> List[Tuple[Tuple[str, str], int]]:
+        """Объединяет самые популярные и самые свежие инструменты для предзагрузки"""
+        with self._lock:
+            candidates = dict(self._popular_symbols(top_n))
+            for key in self._recent_keys(top_n):
+                if key not in candidates:
+                    candidates[key] = self._estimate_frequency(key)
+        return list(candidates.items())
     
     def start_preload_daemon(self):
         """Запускает демон предзагрузки"""
@@ -38,6 +151,7 @@ class CachePredictor:
             return
             
         self.running = True
+        self._stop_event.clear()
         self.preload_thread = threading.Thread(target=self._preload_worker, daemon=True)
         self.preload_thread.start()
         logger.info("✅ Демон предзагрузки запущен")
@@ -45,34 +159,50 @@ class CachePredictor:
     def stop_preload_daemon(self):
         """Останавливает демон предзагрузки"""
         self.running = False
+        self._stop_event.set()
         if self.preload_thread:
             self.preload_thread.join(timeout=5)
             logger.info("✅ Демон предзагрузки остановлен")
     
+    @staticmethod
+    def _seconds_until_preload_window(now: datetime = None) -> float:
+        """Секунды до начала ближайшего окна предзагрузки (0, если окно уже идет)"""
+        now = now or datetime.now()
+        window_start, window_end = _PRELOAD_WINDOW
+        if window_start <= now.time() <= window_end:
+            return 0.0
+        
+        target = datetime.combine(now.date(), window_start)
+        if target <= now:
+            target += timedelta(days=1)
+        return (target - now).total_seconds()
+    
+    def _run_preload(self):
+        """Предзагружает популярные и недавние инструменты"""
+        candidates = self.get_preload_candidates(3)  # Топ-3 по частоте и свежести
+        
+        for (symbol, timeframe), count in candidates:
+            logger.info(f"🔮 Предзагрузка {symbol} ({timeframe}) - популярность: {count}")
+            try:
+                if hasattr(self.cache_manager, 'preload_data'):
+                    self.cache_manager.preload_data(symbol, timeframe, days_back=7)
+            except Exception as e:
+                logger.warning(f"Ошибка предзагрузки {symbol}: {e}")
+    
     def _preload_worker(self):
         """Рабочий процесс предзагрузки"""
-        import time as time_module
         while self.running:
             try:
-                # Предзагружаем популярные инструменты в нерабочее время
-                current_time = datetime.now().time()
-                if time(2, 0) <= current_time <= time(5, 0):  # Ночью
-                    popular_symbols = self.get_popular_symbols(3)  # Топ-3
-                    
-                    for (symbol, timeframe), count in popular_symbols:
-                        logger.info(f"🔮 Предзагрузка {symbol} ({timeframe}) - популярность: {count}")
-                        try:
-                            if hasattr(self.cache_manager, 'preload_data'):
-                                self.cache_manager.preload_data(symbol, timeframe, days_back=7)
-                        except Exception as e:
-                            logger.warning(f"Ошибка предзагрузки {symbol}: {e}")
+                # Спим до ночного окна или сигнала остановки
+                if self._stop_event.wait(self._seconds_until_preload_window()):
+                    break
+                
+                self._run_preload()
                 
-                # Ждем 1 час до следующей проверки
-                for _ in range(3600):
-                    if not self.running:
-                        break
-                    time_module.sleep(1)
+                # Пропускаем остаток окна (3 часа), чтобы не повторять предзагрузку
+                if self._stop_event.wait(3 * 3600):
+                    break
                 
             except Exception as e:
                 logger.error(f"Ошибка в демоне предзагрузки: {e}")
-                time_module.sleep(300)  # Ждем 5 минут при ошибке
\ No newline at end of file
+                self._stop_event.wait(300)  # Ждем 5 минут при ошибке
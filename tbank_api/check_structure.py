@@ -19,6 +19,9 @@ def check_tbank_api_structure():
     
     print(f"✅ Папка {tbank_path} существует")
     
+    # Один проход по каталогу вместо отдельной проверки каждого файла
+    entries = {entry.name: entry for entry in os.scandir(tbank_path)}
+    
     # Проверяем необходимые файлы
     required_files = [
         '__init__.py',
@@ -29,20 +32,19 @@ def check_tbank_api_structure():
     ]
     
     for file in required_files:
-        file_path = os.path.join(tbank_path, file)
-        if os.path.exists(file_path):
+        entry = entries.get(file)
+        if entry is not None and entry.is_file():
             print(f"✅ {file} - существует")
         else:
             print(f"❌ {file} - отсутствует")
     
     # Показываем содержимое папки
     print(f"\n📁 Содержимое папки {tbank_path}:")
-    for item in os.listdir(tbank_path):
-        item_path = os.path.join(tbank_path, item)
-        if os.path.isfile(item_path):
-            print(f"   📄 {item}")
+    for name, entry in entries.items():
+        if entry.is_file():
+            print(f"   📄 {name}")
         else:
-            print(f"   📁 {item}/")
+            print(f"   📁 {name}/")
 
 if __name__ == "__main__":
     check_tbank_api_structure()
\ No newline at end of file
@@ -1,154 +1,408 @@
 """
 Правильный сервис инструментов Tinkoff Invest API
 """
+import asyncio
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+import weakref
+import numpy as np
 import pandas as pd
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from tinkoff.invest import Client, InstrumentStatus, InstrumentIdType
+from tinkoff.invest import (AsyncClient, Client, InstrumentStatus, InstrumentIdType,
+                            InstrumentType)
+
+from .tbank_cache import TBankCache
+from .ttl_cache import ttl_cache, clear_ttl_cache
+
+logger = logging.getLogger(__name__)
+
+# Время жизни кэша справочников инструментов (секунды): справочники меняются не чаще раза в день
+CATALOG_CACHE_TTL = 3600
+# Время жизни и размер кэша результатов поиска
+SEARCH_CACHE_TTL = 3600
+SEARCH_CACHE_SIZE = 512
+# Размер кэша ответов get_instrument_by (время жизни - CATALOG_CACHE_TTL)
+INSTRUMENT_CACHE_SIZE = 4096
+
+# Интернированные значения фильтра российских акций
+_RUB = sys.intern('rub')
+_RU = sys.intern('RU')
+
+# Популярные российские акции в порядке вывода
+_POPULAR_TICKERS = ('SBER', 'GAZP', 'LKOH', 'ROSN', 'YNDX', 'VTBR', 'TATN',
+                    'GMKN', 'PLZL', 'NLMK', 'POLY', 'AFKS', 'PHOR', 'MTSS')
+_POPULAR_RANK = {ticker: i for i, ticker in enumerate(_POPULAR_TICKERS)}
+
+# Типы справочников InstrumentsService
+_CATALOG_TYPES = ('shares', 'etfs', 'bonds', 'currencies')
+
+# Часто используемые значения перечислений
+_STATUS_BASE = InstrumentStatus.INSTRUMENT_STATUS_BASE
+_ID_FIGI = InstrumentIdType.INSTRUMENT_ID_TYPE_FIGI
+
+# Фильтр типа для поиска на стороне сервера
+_INSTRUMENT_KINDS = {
+    'share': InstrumentType.INSTRUMENT_TYPE_SHARE,
+    'etf': InstrumentType.INSTRUMENT_TYPE_ETF,
+    'bond': InstrumentType.INSTRUMENT_TYPE_BOND,
+    'currency': InstrumentType.INSTRUMENT_TYPE_CURRENCY,
+    'futures': InstrumentType.INSTRUMENT_TYPE_FUTURES,
+}
+
+# Колонки возвращаемых DataFrame
+_SHARE_COLS = ('FIGI', 'Ticker', 'Name', 'Currency', 'Lot', 'Exchange', 'Sector', 'Country')
+_SEARCH_COLS = ('FIGI', 'Ticker', 'Name', 'Type', 'Currency', 'Lot', 'Exchange',
+                'API Trade Available')
+_INSTRUMENT_COLS = ('FIGI', 'Ticker', 'Name', 'Type', 'Currency', 'Lot', 'Exchange',
+                    'Country', 'API Trade Available')
+
+# Явные типы колонок: строки с малым числом различных значений хранятся как category
+_COLUMN_DTYPES = {
+    'Type': 'category',
+    'Currency': 'category',
+    'Exchange': 'category',
+    'Sector': 'category',
+    'Country': 'category',
+    'Lot': 'int32',
+    'API Trade Available': 'bool',
+}
+
+
+def _apply_dtypes(df):
+    """Приводит колонки DataFrame к явно заданным типам"""
+    dtypes = {column: dtype for column, dtype in _COLUMN_DTYPES.items() if column in df.columns}
+    return df.astype(dtypes) if dtypes else df
 
 
 class InstrumentService:
     """Сервис для работы со справочной информацией об инструментах"""
     
-    def __init__(self, token=None):
+    def __init__(self, token=None, cache: TBankCache = None):
         self.token = token
+        # Дисковый кэш справочников: теплый старт без обращения к API.
+        # Если не передан, создается при первом обращении к диску
+        self._cache = cache
+        self._cache_lock = threading.Lock()
+        self._client = None
+        self._client_finalizer = None
+        self._client_lock = threading.Lock()
+        # Ответы get_instrument_by по FIGI: figi -> (время monotonic, ответ)
+        self._instruments_by_figi = OrderedDict()
+        self._instruments_lock = threading.Lock()
+    
+    @property
+    def cache(self) -> TBankCache:
+        """Дисковый кэш справочников (каталоги кэша создаются только при первом обращении)"""
+        if self._cache is None:
+            with self._cache_lock:
+                if self._cache is None:
+                    self._cache = TBankCache()
+        return self._cache
     
     def _get_client(self):
-        """Создает клиент для запросов"""
-        return Client(self.token)
+        """Возвращает долгоживущий клиент, открывая канал при первом обращении"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    client_ctx = Client(self.token)
+                    self._client = client_ctx.__enter__()
+                    # Канал закроется при сборке сервиса или завершении интерпретатора
+                    self._client_finalizer = weakref.finalize(
+                        self, client_ctx.__exit__, None, None, None)
+        return self._client
     
-    def get_all_shares(self):
+    def close(self):
+        """Закрывает канал клиента"""
+        with self._client_lock:
+            if self._client_finalizer is not None:
+                self._client_finalizer()
+            self._client_finalizer = None
+            self._client = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+    
+    @ttl_cache(CATALOG_CACHE_TTL)
+    def get_all_shares(self, instrument_status=_STATUS_BASE):
         """Получение всех акций"""
-        with self._get_client() as client:
-            response = client.instruments.shares()
-            return response.instruments
+        client = self._get_client()
+        response = client.instruments.shares(instrument_status=instrument_status)
+        return response.instruments
     
-    def get_all_etfs(self):
+    @ttl_cache(CATALOG_CACHE_TTL)
+    def get_all_etfs(self, instrument_status=_STATUS_BASE):
         """Получение всех ETF"""
-        with self._get_client() as client:
-            response = client.instruments.etfs()
-            return response.instruments
+        client = self._get_client()
+        response = client.instruments.etfs(instrument_status=instrument_status)
+        return response.instruments
     
-    def get_all_bonds(self):
+    @ttl_cache(CATALOG_CACHE_TTL)
+    def get_all_bonds(self, instrument_status=_STATUS_BASE):
         """Получение всех облигаций"""
-        with self._get_client() as client:
-            response = client.instruments.bonds()
-            return response.instruments
+        client = self._get_client()
+        response = client.instruments.bonds(instrument_status=instrument_status)
+        return response.instruments
     
-    def get_all_currencies(self):
+    @ttl_cache(CATALOG_CACHE_TTL)
+    def get_all_currencies(self, instrument_status=_STATUS_BASE):
         """Получение всех валют"""
-        with self._get_client() as client:
-            response = client.instruments.currencies()
-            return response.instruments
+        client = self._get_client()
+        response = client.instruments.currencies(instrument_status=instrument_status)
+        return response.instruments
+    
+    def iter_instruments(self, instrument_type='shares', currency=None):
+        """Ленивый обход справочника с необязательным фильтром по валюте"""
+        if instrument_type not in _CATALOG_TYPES:
+            return
+        get_catalog = getattr(self, f'get_all_{instrument_type}')
+        
+        if currency is None:
+            yield from get_catalog()
+        else:
+            yield from (instrument for instrument in get_catalog() if instrument.currency == currency)
     
-    def find_instrument(self, query):
-        """Поиск инструментов"""
-        with self._get_client() as client:
+    def iter_all_shares(self):
+        """Ленивый обход всех акций (позволяет прервать просмотр досрочно)"""
+        return self.iter_instruments('shares')
+    
+    def clear_cache(self):
+        """Сброс кэша справочников инструментов"""
+        clear_ttl_cache(self)
+        with self._instruments_lock:
+            self._instruments_by_figi.clear()
+    
+    @ttl_cache(SEARCH_CACHE_TTL, maxsize=SEARCH_CACHE_SIZE)
+    def find_instrument(self, query, instrument_type=None):
+        """Поиск инструментов (результат кэшируется по запросу и типу)
+
+        instrument_type ('share', 'etf', 'bond', 'currency', 'futures') фильтрует
+        результаты на стороне сервера
+        """
+        client = self._get_client()
+        instrument_kind = _INSTRUMENT_KINDS.get(instrument_type)
+        if instrument_kind is None:
             response = client.instruments.find_instrument(query=query)
-            return response.instruments
+        else:
+            response = client.instruments.find_instrument(query=query, instrument_kind=instrument_kind)
+        # Поле figi есть у каждого сообщения, пустые результаты отсекаются сразу
+        return tuple(instrument for instrument in response.instruments if instrument.figi)
+    
+    @ttl_cache(CATALOG_CACHE_TTL)
+    def _ticker_index(self):
+        """Индекс тикер -> [(тип, инструмент)] по закэшированным справочникам"""
+        index = {}
+        for instrument_type, instrument in self._iter_catalogs():
+            index.setdefault(instrument.ticker, []).append((instrument_type, instrument))
+        return index
+    
+    def _iter_catalogs(self):
+        """Обход всех справочников в виде пар (тип инструмента, инструмент)"""
+        for instrument_type, get_catalog in (('share', self.get_all_shares),
+                                             ('etf', self.get_all_etfs),
+                                             ('bond', self.get_all_bonds),
+                                             ('currency', self.get_all_currencies)):
+            for instrument in get_catalog():
+                yield instrument_type, instrument
+    
+    def _cached_instrument(self, figi):
+        """Закэшированный ответ get_instrument_by для FIGI или None"""
+        with self._instruments_lock:
+            entry = self._instruments_by_figi.get(figi)
+        if entry is not None and time.monotonic() - entry[0] < CATALOG_CACHE_TTL:
+            return entry[1]
+        return None
+    
+    def _remember_instrument(self, figi, response):
+        """Сохранение ответа get_instrument_by с вытеснением самых старых записей"""
+        with self._instruments_lock:
+            self._instruments_by_figi[figi] = (time.monotonic(), response)
+            self._instruments_by_figi.move_to_end(figi)
+            while len(self._instruments_by_figi) > INSTRUMENT_CACHE_SIZE:
+                self._instruments_by_figi.popitem(last=False)
     
     def get_instrument_by_figi(self, figi):
-        """Получение инструмента по FIGI"""
-        with self._get_client() as client:
-            instrument = client.instruments.get_instrument_by(
-                id_type=InstrumentIdType.INSTRUMENT_ID_TYPE_FIGI,
-                id=figi
-            )
-            return instrument
+        """Получение инструмента по FIGI (ответ кэшируется на CATALOG_CACHE_TTL)"""
+        cached = self._cached_instrument(figi)
+        if cached is not None:
+            return cached
+        
+        client = self._get_client()
+        instrument = client.instruments.get_instrument_by(
+            id_type=_ID_FIGI,
+            id=figi
+        )
+        self._remember_instrument(figi, instrument)
+        return instrument
     
     def get_popular_russian_shares(self):
         """Получение популярных российских акций"""
         try:
-            shares = self.get_all_shares()
-            data = []
-            
-            popular_tickers = ['SBER', 'GAZP', 'LKOH', 'ROSN', 'YNDX', 'VTBR', 'TATN', 
-                             'GMKN', 'PLZL', 'NLMK', 'POLY', 'AFKS', 'PHOR', 'MTSS']
-            
-            for share in shares:
-                if (hasattr(share, 'ticker') and share.ticker in popular_tickers and
-                    hasattr(share, 'currency') and share.currency == 'rub' and
-                    hasattr(share, 'country_of_risk') and share.country_of_risk == 'RU'):
-                    
-                    data.append({
-                        'FIGI': share.figi,
-                        'Ticker': share.ticker,
-                        'Name': share.name,
-                        'Currency': share.currency,
-                        'Lot': share.lot,
-                        'Exchange': share.exchange,
-                        'Sector': getattr(share, 'sector', ''),
-                        'Country': share.country_of_risk,
-                    })
-            
-            # Сортируем по порядку популярных тикеров
-            df = pd.DataFrame(data)
-            df['SortOrder'] = df['Ticker'].apply(lambda x: popular_tickers.index(x) if x in popular_tickers else 999)
-            df = df.sort_values('SortOrder').drop('SortOrder', axis=1)
+            # Строки раскладываются сразу по порядку популярных тикеров
+            buckets = [None] * len(_POPULAR_TICKERS)
+            remaining = len(_POPULAR_TICKERS)
+            for share in self.iter_instruments('shares', currency=_RUB):
+                # Поля protobuf-сообщений всегда заполнены значениями по умолчанию.
+                # Валюта отфильтрована при обходе, далее страна и поиск тикера
+                if share.country_of_risk != _RU:
+                    continue
+                ticker = share.ticker
+                position = _POPULAR_RANK.get(ticker)
+                if position is None or buckets[position] is not None:
+                    continue
+                
+                buckets[position] = (
+                    share.figi,
+                    ticker,
+                    share.name,
+                    _RUB,
+                    share.lot,
+                    sys.intern(share.exchange),
+                    sys.intern(share.sector),
+                    _RU,
+                )
+                
+                # Все популярные тикеры найдены - остаток списка не просматриваем
+                remaining -= 1
+                if not remaining:
+                    break
             
-            return df
+            df = pd.DataFrame.from_records([row for row in buckets if row], columns=_SHARE_COLS)
+            return _apply_dtypes(df)
             
         except Exception as e:
-            print(f"❌ Ошибка получения популярных акций: {e}")
+            logger.exception("❌ Ошибка получения популярных акций: %s", e)
             return self._get_fallback_data()
     
-    def search_instruments_dataframe(self, query):
-        """Поиск инструментов с возвратом DataFrame"""
+    def search_instruments_dataframe(self, query, instrument_type=None):
+        """Поиск инструментов с возвратом DataFrame (instrument_type - фильтр типа на сервере)"""
         try:
-            instruments = self.find_instrument(query)
-            data = []
+            instruments = self.find_instrument(query, instrument_type)
+            return self._search_results_to_dataframe(
+                (instrument.instrument_type, instrument) for instrument in instruments)
             
-            for instrument in instruments:
-                if hasattr(instrument, 'ticker') and instrument.ticker:
-                    data.append({
-                        'FIGI': instrument.figi,
-                        'Ticker': instrument.ticker,
-                        'Name': instrument.name,
-                        'Type': getattr(instrument, 'instrument_type', ''),
-                        'Currency': getattr(instrument, 'currency', ''),
-                        'Lot': getattr(instrument, 'lot', 1),
-                        'Exchange': getattr(instrument, 'exchange', ''),
-                        'API Trade Available': getattr(instrument, 'api_trade_available_flag', False)
-                    })
+        except Exception as e:
+            logger.exception("❌ Ошибка поиска '%s': %s", query, e)
+            return pd.DataFrame()
+    
+    def search_instruments_many(self, queries, max_workers=10):
+        """Параллельный поиск по нескольким запросам с общим DataFrame результатов"""
+        queries = list(dict.fromkeys(queries))
+        try:
+            # Точные тикеры берутся из одного закэшированного справочника
+            try:
+                ticker_index = self._ticker_index()
+            except Exception as e:
+                logger.warning("⚠️ Индекс тикеров недоступен: %s", e)
+                ticker_index = {}
+            
+            found = [pair for query in queries for pair in ticker_index.get(query, ())]
+            misses = [query for query in queries if query not in ticker_index]
             
-            return pd.DataFrame(data)
+            # Остальные запросы - через find_instrument; gRPC-канал потокобезопасен,
+            # поэтому потоки делят один клиент
+            if misses:
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    results = list(executor.map(self.find_instrument, misses))
+                found.extend((instrument.instrument_type, instrument)
+                             for instrument in itertools.chain.from_iterable(results))
+            
+            return self._search_results_to_dataframe(found)
             
         except Exception as e:
-            print(f"❌ Ошибка поиска '{query}': {e}")
+            logger.exception("❌ Ошибка группового поиска %s: %s", queries, e)
             return pd.DataFrame()
     
-    def get_instruments_dataframe(self, instrument_type='shares'):
-        """Получение инструментов в виде DataFrame"""
+    @staticmethod
+    def _search_results_to_dataframe(typed_instruments):
+        """DataFrame из пар (тип инструмента, инструмент)"""
+        rows = (
+            (
+                instrument.figi,
+                instrument.ticker,
+                instrument.name,
+                sys.intern(instrument_type),
+                sys.intern(getattr(instrument, 'currency', '')),
+                getattr(instrument, 'lot', 1),
+                sys.intern(getattr(instrument, 'exchange', '')),
+                getattr(instrument, 'api_trade_available_flag', False),
+            )
+            for instrument_type, instrument in typed_instruments
+            if instrument.ticker
+        )
+        return _apply_dtypes(pd.DataFrame.from_records(rows, columns=_SEARCH_COLS))
+    
+    def get_instruments_dataframe(self, instrument_type='shares', instruments=None, russian_only=False,
+                                  force_refresh=False):
+        """Получение инструментов в виде DataFrame
+
+        instruments - заранее загруженный справочник,
+        russian_only - только рублевые инструменты с риском РФ,
+        force_refresh - игнорировать дисковый кэш справочника
+        """
         try:
-            if instrument_type == 'shares':
-                instruments = self.get_all_shares()
-            elif instrument_type == 'etfs':
-                instruments = self.get_all_etfs()
-            elif instrument_type == 'bonds':
-                instruments = self.get_all_bonds()
-            elif instrument_type == 'currencies':
-                instruments = self.get_all_currencies()
-            else:
+            if instrument_type not in _CATALOG_TYPES:
                 return pd.DataFrame()
             
-            data = []
+            # Полный справочник сохраняется на диск и живет instruments_ttl (24 часа)
+            cache_key = f"catalog_{instrument_type}"
+            use_disk_cache = instruments is None and not russian_only
+            if use_disk_cache and not force_refresh:
+                cached = self.cache.load_instruments(cache_key)
+                if cached is not None and not cached.empty:
+                    return cached
+            
+            if instruments is None:
+                instruments = self.iter_instruments(instrument_type)
+            
+            # Колонки собираются отдельными списками: pandas не разбирает строки построчно
+            figis, tickers, names, currencies = [], [], [], []
+            lots, exchanges, countries, trade_flags = [], [], [], []
             for instrument in instruments:
-                if hasattr(instrument, 'ticker') and instrument.ticker:
-                    data.append({
-                        'FIGI': instrument.figi,
-                        'Ticker': instrument.ticker,
-                        'Name': instrument.name,
-                        'Type': instrument_type,
-                        'Currency': getattr(instrument, 'currency', ''),
-                        'Lot': getattr(instrument, 'lot', 1),
-                        'Exchange': getattr(instrument, 'exchange', ''),
-                        'Country': getattr(instrument, 'country_of_risk', ''),
-                        'API Trade Available': getattr(instrument, 'api_trade_available_flag', False)
-                    })
+                figis.append(instrument.figi)
+                tickers.append(instrument.ticker)
+                names.append(instrument.name)
+                currencies.append(sys.intern(instrument.currency))
+                lots.append(instrument.lot)
+                exchanges.append(sys.intern(instrument.exchange))
+                countries.append(sys.intern(instrument.country_of_risk))
+                trade_flags.append(instrument.api_trade_available_flag)
+            
+            df = pd.DataFrame({
+                'FIGI': figis,
+                'Ticker': tickers,
+                'Name': names,
+                'Type': instrument_type,
+                'Currency': currencies,
+                'Lot': lots,
+                'Exchange': exchanges,
+                'Country': countries,
+                'API Trade Available': trade_flags,
+            }, columns=_INSTRUMENT_COLS)
+            
+            # Фильтр считается одной векторной маской по колонкам, а не условием в цикле
+            mask = np.asarray(tickers, dtype=object) != ''
+            if russian_only:
+                mask &= ((np.asarray(currencies, dtype=object) == _RUB) &
+                         (np.asarray(countries, dtype=object) == _RU))
+            if not mask.all():
+                df = df.loc[mask].reset_index(drop=True)
+            df = _apply_dtypes(df)
             
-            return pd.DataFrame(data)
+            if use_disk_cache:
+                self.cache.save_instruments(df, cache_key)
+            return df
             
         except Exception as e:
-            print(f"❌ Ошибка получения {instrument_type}: {e}")
+            logger.exception("❌ Ошибка получения %s: %s", instrument_type, e)
             return pd.DataFrame()
     
     def _get_fallback_data(self):
@@ -164,75 +418,147 @@ class InstrumentService:
     def get_trading_schedules(self, exchange='', from_date=None, to_date=None):
         """Получение расписания торгов"""
         try:
-            with self._get_client() as client:
-                if from_date is None:
-                    from datetime import datetime, UTC
-                    from_date = datetime.now(UTC)
-                if to_date is None:
-                    to_date = from_date.replace(hour=23, minute=59, second=59)
-                
-                schedules = client.instruments.trading_schedules(
-                    exchange=exchange,
-                    from_=from_date,
-                    to=to_date
-                )
-                return schedules
+            client = self._get_client()
+            if from_date is None:
+                from datetime import datetime, UTC
+                from_date = datetime.now(UTC)
+            if to_date is None:
+                to_date = from_date.replace(hour=23, minute=59, second=59)
+            
+            schedules = client.instruments.trading_schedules(
+                exchange=exchange,
+                from_=from_date,
+                to=to_date
+            )
+            return schedules
         except Exception as e:
-            print(f"❌ Ошибка получения расписания торгов: {e}")
+            logger.exception("❌ Ошибка получения расписания торгов: %s", e)
             return None
 
     def get_dividends(self, figi, from_date, to_date):
         """Получение информации о дивидендах"""
         try:
-            with self._get_client() as client:
-                dividends = client.instruments.get_dividends(
-                    figi=figi,
-                    from_=from_date,
-                    to=to_date
-                )
-                return dividends
+            client = self._get_client()
+            dividends = client.instruments.get_dividends(
+                figi=figi,
+                from_=from_date,
+                to=to_date
+            )
+            return dividends
         except Exception as e:
-            print(f"❌ Ошибка получения дивидендов: {e}")
+            logger.exception("❌ Ошибка получения дивидендов: %s", e)
             return None
 
     def get_accrued_interests(self, figi, from_date, to_date):
         """Получение графика выплаты купонов по облигации"""
         try:
-            with self._get_client() as client:
-                accrued_interests = client.instruments.get_accrued_interests(
-                    figi=figi,
-                    from_=from_date,
-                    to=to_date
-                )
-                return accrued_interests
+            client = self._get_client()
+            accrued_interests = client.instruments.get_accrued_interests(
+                figi=figi,
+                from_=from_date,
+                to=to_date
+            )
+            return accrued_interests
         except Exception as e:
-            print(f"❌ Ошибка получения купонов: {e}")
+            logger.exception("❌ Ошибка получения купонов: %s", e)
             return None
 
     def get_futures_margin(self, figi):
         """Получение размера гарантийного обеспечения по фьючерсу"""
         try:
-            with self._get_client() as client:
-                margin = client.instruments.get_futures_margin(figi=figi)
-                return margin
+            client = self._get_client()
+            margin = client.instruments.get_futures_margin(figi=figi)
+            return margin
         except Exception as e:
-            print(f"❌ Ошибка получения маржи: {e}")
+            logger.exception("❌ Ошибка получения маржи: %s", e)
             return None
 
+    async def _gather_instrument_calls(self, method_name, calls):
+        """Параллельное выполнение запросов InstrumentsService через одно соединение"""
+        async with AsyncClient(self.token) as client:
+            method = getattr(client.instruments, method_name)
+            results = await asyncio.gather(*(method(**kwargs) for kwargs in calls),
+                                           return_exceptions=True)
+        
+        for kwargs, result in zip(calls, results):
+            if isinstance(result, Exception):
+                logger.error("❌ Ошибка запроса %s для %s: %s",
+                             method_name, kwargs.get('figi') or kwargs.get('id'), result)
+        return [None if isinstance(result, Exception) else result for result in results]
 
-if __name__ == "__main__":
-    from config import Config
-    TOKEN = Config.TINKOFF_TOKEN
-    
-    service = InstrumentService(TOKEN)
+    async def get_instruments_by_figi_bulk_async(self, figis):
+        """Параллельное получение инструментов по списку FIGI"""
+        # Ранее полученные ответы берутся из кэша, в сеть уходят только промахи
+        found = {}
+        for figi in figis:
+            cached = self._cached_instrument(figi)
+            if cached is not None:
+                found[figi] = cached
+        misses = [figi for figi in dict.fromkeys(figis) if figi not in found]
+        if misses:
+            calls = [{'id_type': _ID_FIGI, 'id': figi} for figi in misses]
+            results = await self._gather_instrument_calls('get_instrument_by', calls)
+            for figi, response in zip(misses, results):
+                if response is not None:
+                    self._remember_instrument(figi, response)
+                found[figi] = response
+        return {figi: found[figi] for figi in figis}
+
+    async def get_dividends_bulk_async(self, figis, from_date, to_date):
+        """Параллельное получение дивидендов по списку FIGI"""
+        calls = [{'figi': figi, 'from_': from_date, 'to': to_date} for figi in figis]
+        results = await self._gather_instrument_calls('get_dividends', calls)
+        return dict(zip(figis, results))
+
+    async def get_accrued_interests_bulk_async(self, figis, from_date, to_date):
+        """Параллельное получение купонов по списку FIGI облигаций"""
+        calls = [{'figi': figi, 'from_': from_date, 'to': to_date} for figi in figis]
+        results = await self._gather_instrument_calls('get_accrued_interests', calls)
+        return dict(zip(figis, results))
+
+    async def bulk_catalogs_async(self, instrument_types=_CATALOG_TYPES,
+                                  instrument_status=_STATUS_BASE):
+        """Параллельная загрузка нескольких справочников через одно соединение"""
+        async with AsyncClient(self.token) as client:
+            responses = await asyncio.gather(*(
+                getattr(client.instruments, instrument_type)(instrument_status=instrument_status)
+                for instrument_type in instrument_types
+            ))
+        return {instrument_type: response.instruments
+                for instrument_type, response in zip(instrument_types, responses)}
+
+    def get_instruments_by_figi_bulk(self, figis):
+        """Получение инструментов по списку FIGI (синхронная обертка)"""
+        return asyncio.run(self.get_instruments_by_figi_bulk_async(list(figis)))
+
+    def get_dividends_bulk(self, figis, from_date, to_date):
+        """Получение дивидендов по списку FIGI (синхронная обертка)"""
+        return asyncio.run(self.get_dividends_bulk_async(list(figis), from_date, to_date))
+
+    def get_accrued_interests_bulk(self, figis, from_date, to_date):
+        """Получение купонов по списку FIGI облигаций (синхронная обертка)"""
+        return asyncio.run(self.get_accrued_interests_bulk_async(list(figis), from_date, to_date))
+
+    def bulk_catalogs(self, instrument_types=_CATALOG_TYPES,
+                      instrument_status=_STATUS_BASE):
+        """Загрузка нескольких справочников за один проход (синхронная обертка)
+
+        Результат можно передать в get_instruments_dataframe(..., instruments=...)
+        """
+        return asyncio.run(self.bulk_catalogs_async(tuple(instrument_types), instrument_status))
+
+
+if __name__ == "__main__" and os.getenv('TBANK_SMOKE'):
+    # Смоук-тест с живыми запросами к API: TBANK_SMOKE=1 TBANK_TOKEN=... python -m tbank_api.instrument_service
+    service = InstrumentService(os.environ['TBANK_TOKEN'])
     
     print("🚀 Тестирование InstrumentService...")
     
     # Тест популярных акций
     popular = service.get_popular_russian_shares()
     print(f"📈 Популярные акции: {len(popular)}")
-    print(popular[['Ticker', 'Name', 'Lot']].head())
+    print(popular[['Ticker', 'Name', 'Lot']].head().to_string())
     
     # Тест поиска
     search = service.search_instruments_dataframe("GAZP")
-    print(f"🔍 Поиск GAZP: {len(search)} результатов")
\ No newline at end of file
+    print(f"🔍 Поиск GAZP: {len(search)} результатов")
@@ -3,28 +3,94 @@
 Модуль для работы с API Московской Биржи
 """
 
+import asyncio
+import functools
+import numpy as np
 import requests
 import pandas as pd
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from collections import defaultdict
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 import logging
+import time
 from utils.error_handler import with_error_handling
 
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    aiohttp = None
+    AIOHTTP_AVAILABLE = False
+    logging.debug("aiohttp не установлен. Котировки будут запрашиваться последовательно.")
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+    ORJSON_AVAILABLE = True
+except ImportError:
+    import json
+    _json_loads = json.loads
+    ORJSON_AVAILABLE = False
+    logging.debug("orjson не установлен. Ответы ISS будут разбираться стандартным json.")
+
 logger = logging.getLogger(__name__)
 
+# Котировки считаются свежими QUOTES_CACHE_TTL секунд (UI опрашивает одни и те же тикеры)
+QUOTES_CACHE_TTL = 2.0
+QUOTES_CACHE_SIZE = 4096
+
+# Колонки результата get_current_quotes
+_QUOTE_COLUMNS = ['symbol', 'last', 'change', 'volume', 'timestamp']
+
+# Колонки, запрашиваемые у ISS для свечей и списка инструментов
+_CANDLE_COLUMNS = ('open', 'close', 'high', 'low', 'volume', 'begin')
+_SECURITY_COLUMNS = ('SECID', 'SHORTNAME', 'LOTSIZE', 'CURRENCY', 'STATUS')
+
+# Частоты полного временного ряда для заполнения пропусков
+_FREQ = {'H1': pd.offsets.Hour(1), 'H4': pd.offsets.Hour(4), 'D': pd.offsets.Day(1)}
+
+# Формат поля begin у свечей ISS
+_ISS_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Справочники для определения рынка и борда по тикеру
+_STOCKS = frozenset({'SBER', 'GAZP', 'LKOH', 'ROSN', 'VTBR', 'YNDX', 'GMKN', 'NVTK', 'TATN', 'MTSS'})
+_INDEXES = frozenset({'IMOEX', 'RTSI', 'RGBI'})
+_FUT_PREFIXES = ('Si', 'RI', 'BR', 'GZ', 'GD')
+
+# Известный тикер -> (рынок, борд) одним поиском в словаре
+_SYMBOL_ROUTE = {symbol: ('shares', 'TQBR') for symbol in _STOCKS}
+_SYMBOL_ROUTE.update({symbol: ('index', 'SNDX') for symbol in _INDEXES})
+
 class MoexAPI:
     """Класс для работы с API Московской Биржи"""
     
     def __init__(self):
         self.base_url = "https://iss.moex.com/iss"
         self.session = requests.Session()
+        self._quote_cache = {}  # тикер -> (время получения, котировка)
         self._setup_session()
     
     def _setup_session(self):
         """Настройка HTTP сессии"""
         self.session.headers.update({
-            'User-Agent': 'TradingSystem/1.0'
+            'User-Agent': 'TradingSystem/1.0',
+            'Connection': 'keep-alive'
         })
+        
+        # Пул keep-alive соединений и повтор идемпотентных GET при сбоях шлюза
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=32,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=frozenset(['GET'])
+            )
+        )
+        self.session.mount('https://', adapter)
     
     @with_error_handling
     def get_historical_data(self, symbol: str, 
@@ -71,7 +137,11 @@ class MoexAPI:
         params = {
             'from': start_date,
             'till': end_date,
-            'interval': interval
+            'interval': interval,
+            # Только нужные колонки свечей без метаданных - меньше ответ и разбор JSON
+            'iss.only': 'candles',
+            'iss.meta': 'off',
+            'candles.columns': ','.join(_CANDLE_COLUMNS)
         }
         
         try:
@@ -79,7 +149,7 @@ class MoexAPI:
             response = self.session.get(endpoint, params=params, timeout=30)
             response.raise_for_status()
             
-            data = response.json()
+            data = _json_loads(response.content)
             
             # Проверяем наличие данных
             if 'candles' not in data or 'data' not in data['candles']:
@@ -92,22 +162,22 @@ class MoexAPI:
                 logger.warning(f"Нет данных МБ для {symbol} за период {start_date} - {end_date}")
                 return pd.DataFrame()
             
-            # Создаем DataFrame
-            columns = ['open', 'close', 'high', 'low', 'value', 'volume', 'begin', 'end']
-            df = pd.DataFrame(candles, columns=columns)
+            # Транспонируем строки в колонки один раз и собираем DataFrame
+            # из массивов (порядок колонок - как вернул ISS)
+            names = data['candles'].get('columns') or list(_CANDLE_COLUMNS)
+            columns = dict(zip(names, zip(*candles)))
             
-            # Преобразуем даты
-            df['date'] = pd.to_datetime(df['begin'])
-            df.set_index('date', inplace=True)
+            dates = pd.to_datetime(columns['begin'], format=_ISS_DATETIME_FORMAT, cache=True)
             
-            # Стандартизируем колонки
+            # Цены во float64 (сужение до float32 - дело оптимизатора с проверкой точности),
+            # объем в int64 (объемы МБ не помещаются в int32)
             result_df = pd.DataFrame({
-                'open': df['open'],
-                'high': df['high'],
-                'low': df['low'],
-                'close': df['close'],
-                'volume': df['volume']
-            })
+                'open': np.asarray(columns['open'], dtype=np.float64),
+                'high': np.asarray(columns['high'], dtype=np.float64),
+                'low': np.asarray(columns['low'], dtype=np.float64),
+                'close': np.asarray(columns['close'], dtype=np.float64),
+                'volume': np.asarray(columns['volume'], dtype=np.int64)
+            }, index=pd.DatetimeIndex(dates, name='date'), copy=False)
             
             # Обработка пропусков для часовых данных
             if timeframe in ['H1', 'H4']:
@@ -140,27 +210,29 @@ class MoexAPI:
             return data
         
         # Определяем частоту
-        freq_map = {'H1': '1H', 'H4': '4H', 'D': '1D'}
-        freq = freq_map.get(timeframe, '1H')
+        freq = _FREQ.get(timeframe, _FREQ['H1'])
         
         # Создаем полный временной ряд (только в рабочие часы)
         if timeframe in ['H1', 'H4']:
             # Для внутридневных данных - только торговые часы (10:00-18:45 МСК)
-            start_time = pd.Timestamp(data.index.min().date()) + pd.Timedelta(hours=7)  # 10:00 МСК = 7:00 UTC
-            end_time = pd.Timestamp(data.index.min().date()) + pd.Timedelta(hours=15, minutes=45)  # 18:45 МСК = 15:45 UTC
+            day_start = data.index.min().normalize()  # сохраняет часовой пояс индекса
+            start_time = day_start + pd.Timedelta(hours=7)  # 10:00 МСК = 7:00 UTC
+            end_time = day_start + pd.Timedelta(hours=15, minutes=45)  # 18:45 МСК = 15:45 UTC
             full_index = pd.date_range(start=start_time, end=end_time, freq=freq)
         else:
             full_index = pd.date_range(start=data.index.min(), end=data.index.max(), freq=freq)
         
-        # Реиндексируем данные
-        result = data.reindex(full_index)
+        if not data.index.is_monotonic_increasing:
+            data = data.sort_index()
         
-        # Заполняем пропущенные значения (forward fill для OHLC, 0 для объема)
-        result[['open', 'high', 'low', 'close']] = result[['open', 'high', 'low', 'close']].ffill()
-        result['volume'] = result['volume'].fillna(0)
+        # Реиндексируем за один проход по каждой группе колонок без повышения типов:
+        # forward fill для OHLC, 0 для объема
+        prices = data[['open', 'high', 'low', 'close']].reindex(full_index, method='ffill')
+        volume = data['volume'].reindex(full_index, fill_value=0)
+        result = pd.concat([prices, volume], axis=1)
         
-        # Удаляем строки где все значения NaN (в начале ряда)
-        result = result.dropna(subset=['open', 'high', 'low', 'close'])
+        # Отрезаем начало ряда до первой свечи (там нечем заполнить OHLC)
+        result = result.loc[data.index.min():]
         
         return result
     
@@ -179,43 +251,142 @@ class MoexAPI:
         pd.DataFrame
             Текущие котировки
         """
-        quotes_data = []
+        now = time.monotonic()
+        quotes_by_symbol = {}
         
+        # Свежие котировки берем из кэша, остальные группируем для запроса:
+        # одна ISS-выборка на пару (рынок, борд) вместо запроса на каждый тикер
+        groups = defaultdict(list)
         for symbol in symbols:
+            cached = self._quote_cache.get(symbol)
+            if cached is not None and now - cached[0] < QUOTES_CACHE_TTL:
+                quotes_by_symbol[symbol] = cached[1]
+            else:
+                groups[self._detect_market_and_board(symbol)].append(symbol)
+        
+        if groups:
+            fetched = self._request_quotes(groups)
+            quotes_by_symbol.update((quote[0], quote) for quote in fetched)
+            self._remember_quotes(fetched, now)
+        
+        # Строки - в порядке запрошенных тикеров, а не в порядке кэш/борды
+        quotes_data = [quotes_by_symbol[symbol] for symbol in symbols if symbol in quotes_by_symbol]
+        return pd.DataFrame.from_records(quotes_data, columns=_QUOTE_COLUMNS)
+    
+    def _request_quotes(self, groups: Dict[Tuple[str, str], List[str]]) -> List[tuple]:
+        """Запрос котировок по сгруппированным тикерам"""
+        if AIOHTTP_AVAILABLE:
             try:
-                market, board = self._detect_market_and_board(symbol)
-                endpoint = f"{self.base_url}/engines/stock/markets/{market}/boards/{board}/securities/{symbol}.json"
-                
-                response = self.session.get(endpoint, timeout=10)
+                asyncio.get_running_loop()
+            except RuntimeError:
+                # Работающего event loop нет - корутину создаем только здесь,
+                # чтобы на синхронном пути не оставалось корутины без await
+                return asyncio.run(self._fetch_quotes_async(groups))
+            # Вызов из работающего event loop - уходим на синхронный путь
+            logger.debug("Асинхронный запрос котировок недоступен внутри работающего event loop")
+        
+        quotes_data = []
+        
+        for (market, board), board_symbols in groups.items():
+            try:
+                response = self.session.get(self._quotes_endpoint(market, board),
+                                            params=self._quotes_params(board_symbols),
+                                            timeout=10)
                 response.raise_for_status()
                 
-                data = response.json()
-                
-                if 'marketdata' not in data or 'data' not in data['marketdata']:
-                    continue
-                    
-                market_data = data['marketdata']['data']
-                
-                if market_data:
-                    quote = market_data[0]
-                    # Безопасное извлечение данных (индексы могут отличаться)
-                    last_price = quote[12] if len(quote) > 12 and quote[12] else (quote[4] if len(quote) > 4 else 0)
-                    change = quote[13] if len(quote) > 13 and quote[13] else 0
-                    volume = quote[27] if len(quote) > 27 and quote[27] else 0
-                    
-                    quotes_data.append({
-                        'symbol': symbol,
-                        'last': last_price,
-                        'change': change,
-                        'volume': volume,
-                        'timestamp': datetime.now()
-                    })
+                quotes_data.extend(self._parse_quotes(_json_loads(response.content)))
                     
             except Exception as e:
-                logger.error(f"Ошибка получения котировки МБ для {symbol}: {e}")
+                logger.error(f"Ошибка получения котировок МБ для {', '.join(board_symbols)}: {e}")
                 continue
         
-        return pd.DataFrame(quotes_data)
+        return quotes_data
+    
+    def _remember_quotes(self, quotes: List[tuple], now: float):
+        """Сохранение котировок в кэш с вытеснением самых старых записей"""
+        for quote in quotes:
+            self._quote_cache.pop(quote[0], None)
+            self._quote_cache[quote[0]] = (now, quote)
+        while len(self._quote_cache) > QUOTES_CACHE_SIZE:
+            del self._quote_cache[next(iter(self._quote_cache))]
+    
+    def clear_cache(self):
+        """Очистка кэша котировок"""
+        self._quote_cache.clear()
+    
+    async def _fetch_quotes_async(self, groups: Dict[Tuple[str, str], List[str]]) -> List[tuple]:
+        """Параллельный запрос котировок по всем бордам одной сессией aiohttp"""
+        connector = aiohttp.TCPConnector(limit=32, ttl_dns_cache=300)
+        async with aiohttp.ClientSession(connector=connector,
+                                         headers=dict(self.session.headers)) as session:
+            results = await asyncio.gather(
+                *(self._fetch_board_quotes(session, market, board, board_symbols)
+                  for (market, board), board_symbols in groups.items()),
+                return_exceptions=True
+            )
+        
+        quotes_data = []
+        for board_symbols, result in zip(groups.values(), results):
+            if isinstance(result, Exception):
+                logger.error(f"Ошибка получения котировок МБ для {', '.join(board_symbols)}: {result}")
+            else:
+                quotes_data.extend(result)
+        return quotes_data
+    
+    async def _fetch_board_quotes(self, session, market: str, board: str,
+                                  symbols: List[str]) -> List[tuple]:
+        """Запрос котировок всех тикеров одного борда"""
+        async with session.get(self._quotes_endpoint(market, board),
+                               params=self._quotes_params(symbols),
+                               timeout=aiohttp.ClientTimeout(total=10)) as response:
+            response.raise_for_status()
+            data = _json_loads(await response.read())
+        return self._parse_quotes(data)
+    
+    def _quotes_endpoint(self, market: str, board: str) -> str:
+        """URL котировок борда"""
+        return f"{self.base_url}/engines/stock/markets/{market}/boards/{board}/securities.json"
+    
+    @staticmethod
+    def _quotes_params(symbols: List[str]) -> Dict[str, str]:
+        """Параметры ISS: только marketdata по перечисленным тикерам"""
+        return {
+            'securities': ','.join(symbols),
+            'iss.only': 'marketdata',
+            'iss.meta': 'off'
+        }
+    
+    @staticmethod
+    def _parse_quotes(data: Dict) -> List[tuple]:
+        """Извлечение котировок из блока marketdata ответа ISS"""
+        if 'marketdata' not in data or 'data' not in data['marketdata']:
+            return []
+        
+        columns = data['marketdata'].get('columns', [])
+        market_data = data['marketdata']['data']
+        
+        if not market_data or 'SECID' not in columns:
+            return []
+        
+        # Позиции колонок берем из ответа, а не из захардкоженных индексов
+        idx = {name: i for i, name in enumerate(columns)}
+        secid_i = idx['SECID']
+        last_i, offer_i, change_i, volume_i = (
+            idx.get(name) for name in ('LAST', 'OFFER', 'LASTCHANGE', 'VOLTODAY')
+        )
+        timestamp = datetime.now()
+        
+        def pick(row, i):
+            return row[i] if i is not None else None
+        
+        return [
+            (row[secid_i],
+             pick(row, last_i) or pick(row, offer_i) or 0,
+             pick(row, change_i) or 0,
+             pick(row, volume_i) or 0,
+             timestamp)
+            for row in market_data
+        ]
     
     @with_error_handling
     def get_instruments_list(self, market: str = 'shares') -> pd.DataFrame:
@@ -244,7 +415,13 @@ class MoexAPI:
         endpoint = f"{self.base_url}/engines/stock/markets/{market}/boards/{board}/securities.json"
         
         try:
-            response = self.session.get(endpoint, params={'limit': 500}, timeout=10)
+            params = {
+                'limit': 500,
+                'iss.only': 'securities',
+                'iss.meta': 'off',
+                'securities.columns': ','.join(_SECURITY_COLUMNS)
+            }
+            response = self.session.get(endpoint, params=params, timeout=10)
             response.raise_for_status()
             
             data = response.json()
@@ -261,39 +438,21 @@ class MoexAPI:
             if df.empty:
                 return pd.DataFrame()
             
-            # Безопасное создание результата
-            result_data = []
+            # Фильтруем только активные инструменты
+            if 'STATUS' in df.columns:
+                df = df.loc[df['STATUS'] == 'A']
             
-            for _, row in df.iterrows():
-                instrument = {'symbol': row['SECID'] if 'SECID' in row.index else ''}
-                
-                # Добавляем доступные колонки
-                if 'SHORTNAME' in row.index:
-                    instrument['name'] = row['SHORTNAME']
-                elif 'SECNAME' in row.index:
-                    instrument['name'] = row['SECNAME']
-                else:
-                    instrument['name'] = instrument['symbol']
-                
-                if 'LOTSIZE' in row.index:
-                    instrument['lot_size'] = row['LOTSIZE']
-                else:
-                    instrument['lot_size'] = 1
-                
-                if 'CURRENCY' in row.index:
-                    instrument['currency'] = row['CURRENCY']
-                else:
-                    instrument['currency'] = 'RUB'
-                
-                instrument['type'] = market
-                
-                # Фильтруем только активные инструменты
-                if 'STATUS' in row.index and row['STATUS'] != 'A':
-                    continue
-                    
-                result_data.append(instrument)
+            # Безопасное создание результата: недостающие колонки заменяем значениями по умолчанию
+            name_col = next((c for c in ('SHORTNAME', 'SECNAME', 'SECID') if c in df.columns), None)
+            symbols = df['SECID'] if 'SECID' in df.columns else ''
             
-            result_df = pd.DataFrame(result_data)
+            result_df = pd.DataFrame({
+                'symbol': symbols,
+                'name': df[name_col] if name_col else symbols,
+                'lot_size': df['LOTSIZE'] if 'LOTSIZE' in df.columns else 1,
+                'currency': df['CURRENCY'] if 'CURRENCY' in df.columns else 'RUB',
+                'type': market
+            }, index=df.index).reset_index(drop=True)
             
             logger.info(f"Загружено {len(result_df)} инструментов МБ (рынок: {market})")
             return result_df
@@ -319,7 +478,9 @@ class MoexAPI:
         ]
         return markets
     
-    def _detect_market_and_board(self, symbol: str) -> tuple:
+    @staticmethod
+    @functools.lru_cache(maxsize=2048)
+    def _detect_market_and_board(symbol: str) -> tuple:
         """
         Определение рынка и борда по тикеру
         
@@ -333,21 +494,15 @@ class MoexAPI:
         tuple
             (рынок, борд)
         """
-        # Для акций
-        stock_symbols = ['SBER', 'GAZP', 'LKOH', 'ROSN', 'VTBR', 'YNDX', 'GMKN', 'NVTK', 'TATN', 'MTSS']
-        if symbol in stock_symbols:
-            return 'shares', 'TQBR'
+        # Известные акции и индексы
+        route = _SYMBOL_ROUTE.get(symbol)
+        if route is not None:
+            return route
         
         # Для фьючерсов
-        futures_symbols = ['Si', 'RI', 'BR', 'GZ', 'GD']
-        if any(symbol.startswith(prefix) for prefix in futures_symbols):
+        if symbol.startswith(_FUT_PREFIXES):
             return 'futures', 'RFUD'
         
-        # Для индексов
-        index_symbols = ['IMOEX', 'RTSI', 'RGBI']
-        if symbol in index_symbols:
-            return 'index', 'SNDX'
-        
         # По умолчанию - акции основного рынка
         return 'shares', 'TQBR'
     
@@ -4,9 +4,11 @@
 """
 
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
 import logging
+import time
 
 # ✅ ПРАВИЛЬНЫЙ ИМПОРТ PSUTIL С ОБРАБОТКОЙ ОШИБОК
 try:
@@ -25,14 +27,38 @@ from .auto_optimizer import AutoOptimizer
 
 logger = logging.getLogger(__name__)
 
+# Память процесса опрашиваем не чаще раза в секунду
+MEMORY_SAMPLE_INTERVAL = 1.0
+
+# Сводка аналитики переиспользуется UI-опросами в пределах этого интервала (секунды)
+ANALYTICS_SNAPSHOT_TTL = 0.5
+
+
+def _parse_date(value: str) -> datetime:
+    """Разбор даты 'YYYY-MM-DD' (fromisoformat заметно быстрее strptime)"""
+    return datetime.fromisoformat(value)
+
+
 class OptimizedTBankDataManager:
     """Оптимизированный менеджер с расширенной аналитикой"""
     
     def __init__(self, api_key: str = None):
-        self.api = TBankAPI(api_key)
         self.cache = TBankCache()
+        self.api = TBankAPI(api_key, cache=self.cache)
         self.optimizer = SafeCacheOptimizer()
         self.available_symbols = None
+        self._symbols_lower = None  # Колонки symbol/name в нижнем регистре для поиска
+        self._names_lower = None
+        
+        # Дескриптор процесса и последний замер памяти (MB, время замера)
+        self._process = None
+        if PSUTIL_AVAILABLE:
+            try:
+                self._process = psutil.Process()
+            except Exception as e:
+                logger.warning(f"Не удалось получить дескриптор процесса: {e}")
+        self._memory_sample = (0, float('-inf'))
+        self._analytics_snapshot = None  # (время сбора, сводка)
         
         # ✅ ИНИЦИАЛИЗИРУЕМ РАСШИРЕННУЮ АНАЛИТИКУ
         self.advanced_analytics = AdvancedCacheAnalytics(self)
@@ -64,8 +90,8 @@ class OptimizedTBankDataManager:
             return self.api.get_historical_data(symbol, start_date, end_date, timeframe)
             
         # Конвертация дат
-        from_dt = datetime.strptime(start_date, '%Y-%m-%d')
-        to_dt = datetime.strptime(end_date, '%Y-%m-%d') if end_date else datetime.now()
+        from_dt = _parse_date(start_date)
+        to_dt = _parse_date(end_date) if end_date else datetime.now()
         
         # Получаем FIGI
         figi = self.api._get_figi_by_ticker(symbol)
@@ -89,21 +115,26 @@ class OptimizedTBankDataManager:
         if api_data.empty:
             return pd.DataFrame()
         
-        # Безопасная оптимизация данных
-        original_size = api_data.memory_usage(deep=True).sum() / 1024 / 1024
-        optimized_data = self.optimizer.optimize_dataframe_safe(api_data)
-        
-        # Логируем экономию места
-        optimized_size = optimized_data.memory_usage(deep=True).sum() / 1024 / 1024
-        savings = original_size - optimized_size
-        if savings > 0:
-            self.performance_stats['optimization_savings_mb'] += savings
-            logger.info(f"💾 Экономия памяти: {savings:.2f} MB для {symbol}")
+        # Безопасная оптимизация данных (пропускаем, если источник уже отдал узкие типы)
+        if self.optimizer.is_already_optimized(api_data):
+            optimized_data = api_data
+        else:
+            optimized_data = self.optimizer.optimize_dataframe_safe(api_data)
+            
+            # Экономию считаем по смене типов; точный замер размеров - только в отладке
+            savings = self.optimizer.estimate_savings_mb(api_data, optimized_data)
+            if savings > 0:
+                self.performance_stats['optimization_savings_mb'] += savings
+                logger.info(f"💾 Экономия памяти: {savings:.2f} MB для {symbol}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Размер данных {symbol}: {self.optimizer.frame_size_mb(api_data):.2f} MB -> "
+                             f"{self.optimizer.frame_size_mb(optimized_data):.2f} MB")
         
         # Сохраняем оптимизированные данные в кэш
         self.cache.save_candles(figi, timeframe, optimized_data, (from_dt, to_dt))
         
-        return api_data
+        # Возвращаем те же оптимизированные данные, что легли в кэш
+        return optimized_data
     
     # ===== РАСШИРЕННАЯ АНАЛИТИКА =====
     
@@ -125,10 +156,13 @@ class OptimizedTBankDataManager:
             )
         }
 
-    def get_detailed_analytics(self) -> Dict[str, Any]:
-        """Детальная аналитика с расширенными метриками"""
-        cache_stats = self.cache.get_cache_stats()
-        performance_stats = self.get_performance_stats()
+    def _collect_snapshot(self) -> Dict[str, Any]:
+        """Сводка статистик кэша и аналитики, общая для всех методов аналитики"""
+        now = time.monotonic()
+        if self._analytics_snapshot is not None:
+            collected_at, snapshot = self._analytics_snapshot
+            if now - collected_at < ANALYTICS_SNAPSHOT_TTL:
+                return snapshot
         
         try:
             # Безопасное получение расширенной аналитики
@@ -145,23 +179,28 @@ class OptimizedTBankDataManager:
             }
             active_alerts = []
         
+        snapshot = {
+            'cache_stats': self.cache.get_cache_stats(),
+            'performance_stats': self.get_performance_stats(),
+            'advanced_trends': advanced_trends,
+            'active_alerts': active_alerts
+        }
+        self._analytics_snapshot = (now, snapshot)
+        return snapshot
+    
+    def get_detailed_analytics(self) -> Dict[str, Any]:
+        """Детальная аналитика с расширенными метриками"""
+        snapshot = self._collect_snapshot()
+        
         # ✅ БЕЗОПАСНОЕ ПОЛУЧЕНИЕ ИСПОЛЬЗОВАНИЯ ПАМЯТИ
-        memory_usage = 0
-        if PSUTIL_AVAILABLE:
-            try:
-                process = psutil.Process()
-                memory_usage = process.memory_info().rss / 1024 / 1024  # MB
-            except Exception as e:
-                logger.warning(f"Не удалось получить использование памяти: {e}")
-        else:
-            logger.debug("psutil недоступен, использование памяти не отслеживается")
+        memory_usage = self._get_memory_usage_mb()
         
         return {
-            **cache_stats,
-            **performance_stats,
-            **advanced_trends,
+            **snapshot['cache_stats'],
+            **snapshot['performance_stats'],
+            **snapshot['advanced_trends'],
             'memory_usage_mb': round(memory_usage, 2),
-            'active_alerts_count': len(active_alerts),
+            'active_alerts_count': len(snapshot['active_alerts']),
             'optimization_level': 'advanced',
             'status': 'active',
             'features': {
@@ -172,13 +211,32 @@ class OptimizedTBankDataManager:
             }
         }
 
+    def _get_memory_usage_mb(self) -> int:
+        """Использование памяти процессом в MB с ограничением частоты опроса"""
+        if self._process is None:
+            logger.debug("psutil недоступен, использование памяти не отслеживается")
+            return 0
+        
+        value, sampled_at = self._memory_sample
+        now = time.monotonic()
+        if now - sampled_at < MEMORY_SAMPLE_INTERVAL:
+            return value
+        
+        try:
+            value = self._process.memory_info().rss >> 20  # байты -> MB
+        except Exception as e:
+            logger.warning(f"Не удалось получить использование памяти: {e}")
+        self._memory_sample = (value, now)
+        return value
+    
     def get_advanced_analytics(self) -> Dict[str, Any]:
         """Полная расширенная аналитика"""
+        snapshot = self._collect_snapshot()
         return {
-            'basic_stats': self.get_performance_stats(),
-            'cache_info': self.cache.get_cache_stats(),
-            'advanced_trends': self.advanced_analytics.get_performance_trends(),
-            'active_alerts': self.advanced_analytics.get_active_alerts(),
+            'basic_stats': snapshot['performance_stats'],
+            'cache_info': snapshot['cache_stats'],
+            'advanced_trends': snapshot['advanced_trends'],
+            'active_alerts': snapshot['active_alerts'],
             'metrics_history': {
                 'hit_ratio': self.advanced_analytics.get_metrics_history('hit_ratio', 10),
                 'response_time': self.advanced_analytics.get_metrics_history('response_time', 10)
@@ -188,6 +246,7 @@ class OptimizedTBankDataManager:
     def acknowledge_alert(self, alert_index: int):
         """Подтвердить алерт в расширенной аналитике"""
         self.advanced_analytics.acknowledge_alert(alert_index)
+        self._analytics_snapshot = None
     
     # ===== СОВМЕСТИМОСТЬ С СУЩЕСТВУЮЩИМ КОДОМ =====
     
@@ -215,6 +274,11 @@ class OptimizedTBankDataManager:
         """Получение списка доступных символов с кэшированием"""
         if self.available_symbols is None or force_refresh:
             self.available_symbols = self.get_instruments_with_cache(force_refresh=force_refresh)
+            if self.available_symbols.empty:
+                self._symbols_lower = self._names_lower = None
+            else:
+                self._symbols_lower = self.available_symbols['symbol'].str.lower()
+                self._names_lower = self.available_symbols['name'].str.lower()
         return self.available_symbols
     
     def update_data_incrementally(self, symbol: str, 
@@ -248,8 +312,10 @@ class OptimizedTBankDataManager:
         if symbols_df.empty:
             return pd.DataFrame()
         
-        mask = (symbols_df['symbol'].str.contains(query, case=False, na=False) | 
-                symbols_df['name'].str.contains(query, case=False, na=False))
+        # Подстрочный поиск без регулярных выражений по заранее приведенным к нижнему регистру колонкам
+        q = query.lower()
+        mask = (self._symbols_lower.str.contains(q, regex=False, na=False) | 
+                self._names_lower.str.contains(q, regex=False, na=False))
         
         return symbols_df[mask].copy()
     
@@ -260,7 +326,10 @@ class OptimizedTBankDataManager:
     def clear_all_cache(self):
         """Очистка всего кэша"""
         self.cache.clear_cache()
+        self.api.clear_cache()
         self.available_symbols = None
+        self._symbols_lower = self._names_lower = None
+        self._analytics_snapshot = None
     
     def is_symbol_available(self, symbol: str) -> bool:
         """Проверка доступности символа"""
@@ -268,8 +337,15 @@ class OptimizedTBankDataManager:
         return not symbols_df.empty and symbol in symbols_df['symbol'].values
     
     # ДОБАВЬТЕ НОВЫЕ МЕТОДЫ:
-    def preload_data(self, symbol: str, timeframe: str, days_back: int = 30):
-        """Предзагрузка данных"""
+    def preload_data(self, symbol: str, timeframe: str, days_back: int = 30) -> bool:
+        """
+        Предзагрузка данных
+        
+        Returns:
+        --------
+        bool
+            True, если свечи загружены и сохранены в кэш
+        """
         from datetime import datetime, timedelta
         
         end_date = datetime.now()
@@ -283,15 +359,56 @@ class OptimizedTBankDataManager:
                 timeframe
             )
             
-            if not data.empty:
-                figi = self.api._get_figi_by_ticker(symbol)
-                if figi:
-                    optimized_data = self.optimizer.optimize_dataframe_safe(data)
-                    self.cache.save_candles(figi, timeframe, optimized_data, (start_date, end_date))
-                    logger.info(f"✅ Предзагружено {len(data)} записей для {symbol}")
+            if data.empty:
+                return False
+            
+            figi = self.api._get_figi_by_ticker(symbol)
+            if not figi:
+                return False
+            
+            optimized_data = (data if self.optimizer.is_already_optimized(data)
+                              else self.optimizer.optimize_dataframe_safe(data))
+            if not self.cache.save_candles(figi, timeframe, optimized_data, (start_date, end_date)):
+                return False
+            
+            logger.info(f"✅ Предзагружено {len(data)} записей для {symbol}")
+            return True
                     
         except Exception as e:
             logger.warning(f"Ошибка предзагрузки {symbol}: {e}")
+            return False
+    
+    def preload_many(self, symbols: List[str], timeframe: str,
+                     days_back: int = 30, max_workers: int = 8) -> int:
+        """
+        Параллельная предзагрузка данных по списку символов
+        
+        Загрузка упирается в сеть, поэтому символы обрабатываются в пуле потоков;
+        ошибка одного символа не прерывает остальные.
+        
+        Returns:
+        --------
+        int
+            Количество символов, свечи которых сохранены в кэш
+        """
+        if not symbols:
+            return 0
+        
+        completed = 0
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(symbols))) as executor:
+            futures = {
+                executor.submit(self.preload_data, symbol, timeframe, days_back): symbol
+                for symbol in symbols
+            }
+            for future in as_completed(futures):
+                try:
+                    if future.result():
+                        completed += 1
+                except Exception as e:
+                    logger.warning(f"Ошибка предзагрузки {futures[future]}: {e}")
+        
+        logger.info(f"✅ Предзагрузка завершена: {completed}/{len(symbols)} символов ({timeframe})")
+        return completed
     
     def get_prediction_stats(self) -> Dict[str, Any]:
         """Статистика предсказаний"""
@@ -300,7 +417,7 @@ class OptimizedTBankDataManager:
     def get_optimization_info(self) -> Dict[str, Any]:
         """Информация об оптимизациях"""
         return {
-            'auto_optimization_enabled': self.auto_optimizer.config['optimization_enabled'],
+            'auto_optimization_enabled': self.auto_optimizer.config.optimization_enabled,
             'optimization_history_count': len(self.auto_optimizer.optimization_history),
             'last_optimization': self.auto_optimizer.last_optimization
         }    
\ No newline at end of file
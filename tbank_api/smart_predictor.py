@@ -3,9 +3,13 @@
 Интеллектуальное предсказание и предзагрузка данных
 """
 
+import array
 import heapq
+import math
+import numpy as np
 from datetime import datetime, time
 from collections import defaultdict, deque
+from operator import itemgetter
 import threading
 import time as time_module
 from typing import Dict, List, Tuple, Set, Any
@@ -13,20 +17,63 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Период движка предсказаний и число обращений, досрочно будящее его (секунды / штуки)
+PREDICTION_INTERVAL = 1800
+PREDICTION_RETRY_DELAY = 300
+PREDICTION_WAKE_ACCESSES = 50
+
+# Постоянная затухания счетчиков популярности (секунды)
+POPULARITY_DECAY_TAU = 7 * 24 * 3600
+
+# Порог вероятности, начиная с которого запрос считается вероятным
+LIKELY_REQUEST_THRESHOLD = 0.3
+
+# Начальное число строк матрицы часовых гистограмм (растет удвоением)
+_INITIAL_ROWS = 64
+
+def _score(hours: np.ndarray, totals: np.ndarray, freq_prob: np.ndarray,
+           hour_idx: np.ndarray) -> np.ndarray:
+    """
+    Комбинированная вероятность запроса для строк гистограмм
+    
+    Временная составляющая - максимальная доля обращений среди часов окна,
+    частотная - затухающая популярность относительно самого популярного инструмента.
+    Для пустого окна временная составляющая равна нулю.
+    """
+    if len(hour_idx) == 0:
+        time_prob = np.zeros(len(totals), dtype=np.float64)
+    else:
+        time_prob = hours[:, hour_idx].max(axis=1) / totals
+    return np.minimum(time_prob * 0.6 + freq_prob * 0.4, 1.0)
+
 class SmartPredictor:
     """Умный предсказатель на основе паттернов использования"""
     
     def __init__(self, cache_manager):
         self.cache_manager = cache_manager
         self.access_patterns = defaultdict(lambda: deque(maxlen=1000))
-        self.time_patterns = defaultdict(lambda: defaultdict(int))
-        self.seasonal_patterns = defaultdict(lambda: defaultdict(int))
-        self.popular_symbols = {}
+        # Часовые гистограммы всех инструментов одной матрицей (строка на ключ)
+        self._key_to_row = {}
+        self._row_keys = []
+        self._hour_matrix = np.zeros((_INITIAL_ROWS, 24), dtype=np.int64)
+        self._totals = np.zeros(_INITIAL_ROWS, dtype=np.int64)
+        self._hour_peak = np.zeros(_INITIAL_ROWS, dtype=np.int64)  # Максимум гистограммы строки
+        self.seasonal_patterns = defaultdict(lambda: array.array('I', bytes(28)))  # Счетчики по дням недели
+        # Затухающие счетчики популярности и момент их последнего обновления (monotonic)
+        self._popularity = np.zeros(_INITIAL_ROWS, dtype=np.float64)
+        self._last_access = np.zeros(_INITIAL_ROWS, dtype=np.float64)
+        # Матрицы растут в record_access, а читаются потоком предсказаний и GUI
+        self._lock = threading.Lock()
         
         self.prediction_accuracy = 0
         self.total_predictions = 0
         self.successful_predictions = 0
         
+        # Движок просыпается по таймеру, по всплеску обращений или для остановки
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._accesses_since_run = 0
+        
         self._start_prediction_engine()
     
     def record_access(self, symbol: str, timeframe: str, timestamp: datetime = None):
@@ -36,90 +83,132 @@ class SmartPredictor:
         
         key = (symbol, timeframe)
         
-        # Обновляем паттерны доступа
-        self.access_patterns[key].append(timestamp)
-        self.popular_symbols[key] = self.popular_symbols.get(key, 0) + 1
-        
-        # Анализируем временные паттерны
-        hour = timestamp.hour
-        self.time_patterns[key][hour] += 1
-        
-        # Сезонные паттерны (день недели)
-        day_of_week = timestamp.weekday()
-        self.seasonal_patterns[key][day_of_week] += 1
+        with self._lock:
+            # Обновляем паттерны доступа
+            self.access_patterns[key].append(timestamp)
+            row = self._row_for(key)
+            
+            # Счетчик затухает лениво - только для инструмента, к которому обратились
+            now = time_module.monotonic()
+            decay = math.exp(-(now - self._last_access[row]) / POPULARITY_DECAY_TAU)
+            self._popularity[row] = self._popularity[row] * decay + 1.0
+            self._last_access[row] = now
+            
+            # Анализируем временные паттерны
+            self._hour_matrix[row, timestamp.hour] += 1
+            self._totals[row] += 1
+            hour_count = self._hour_matrix[row, timestamp.hour]
+            if hour_count > self._hour_peak[row]:
+                self._hour_peak[row] = hour_count
+            
+            # Сезонные паттерны (день недели)
+            day_of_week = timestamp.weekday()
+            self.seasonal_patterns[key][day_of_week] += 1
+        
+        # Накопилось достаточно новых обращений - будим движок предсказаний
+        self._accesses_since_run += 1
+        if self._accesses_since_run >= PREDICTION_WAKE_ACCESSES:
+            self._wake.set()
     
-    def get_likely_requests(self, hours_ahead: int = 24) -> List[Tuple[Tuple[str, str], float]]:
-        """Предсказание вероятных запросов"""
-        predictions = []
-        current_time = datetime.now()
-        
-        for (symbol, timeframe), pattern in self.time_patterns.items():
-            probability = self._calculate_request_probability(symbol, timeframe, current_time, hours_ahead)
-            if probability > 0.3:  # Порог вероятности
-                predictions.append(((symbol, timeframe), probability))
-        
-        # Сортируем по вероятности
-        predictions.sort(key=lambda x: x[1], reverse=True)
-        return predictions[:10]  # Топ-10 предсказаний
+    def _row_for(self, key: Tuple[str, str]) -> int:
+        """Строка матрицы гистограмм для ключа (с расширением матрицы при необходимости, под self._lock)"""
+        row = self._key_to_row.get(key)
+        if row is not None:
+            return row
+        
+        row = len(self._row_keys)
+        if row == len(self._totals):
+            capacity = row * 2
+            hour_matrix = np.zeros((capacity, 24), dtype=np.int64)
+            hour_matrix[:row] = self._hour_matrix
+            totals = np.zeros(capacity, dtype=np.int64)
+            totals[:row] = self._totals
+            hour_peak = np.zeros(capacity, dtype=np.int64)
+            hour_peak[:row] = self._hour_peak
+            popularity = np.zeros(capacity, dtype=np.float64)
+            popularity[:row] = self._popularity
+            last_access = np.zeros(capacity, dtype=np.float64)
+            last_access[:row] = self._last_access
+            self._hour_matrix, self._totals, self._hour_peak = hour_matrix, totals, hour_peak
+            self._popularity, self._last_access = popularity, last_access
+        
+        self._row_keys.append(key)
+        self._key_to_row[key] = row
+        return row
     
-    def _calculate_request_probability(self, symbol: str, timeframe: str, 
-                                     current_time: datetime, hours_ahead: int) -> float:
-        """Расчет вероятности запроса"""
-        key = (symbol, timeframe)
-        
-        # Анализ временных паттернов
-        time_prob = self._analyze_time_pattern(key, current_time, hours_ahead)
-        
-        # Анализ частоты обращений
-        freq_prob = self._analyze_frequency_pattern(key)
-        
-        # Комбинированная вероятность
-        combined_prob = (time_prob * 0.6 + freq_prob * 0.4)
-        
-        return min(combined_prob, 1.0)
+    def _current_popularity(self, n_keys: int) -> np.ndarray:
+        """Счетчики популярности первых n_keys инструментов, приведенные к текущему моменту"""
+        elapsed = time_module.monotonic() - self._last_access[:n_keys]
+        return self._popularity[:n_keys] * np.exp(-elapsed / POPULARITY_DECAY_TAU)
     
-    def _analyze_time_pattern(self, key: Tuple[str, str], current_time: datetime, hours_ahead: int) -> float:
-        """Анализ временных паттернов"""
-        hour_patterns = self.time_patterns[key]
-        if not hour_patterns:
-            return 0.0
-        
-        total_requests = sum(hour_patterns.values())
-        current_hour = current_time.hour
-        
-        # Проверяем следующие N часов
-        probability = 0.0
-        for hour_offset in range(hours_ahead):
-            target_hour = (current_hour + hour_offset) % 24
-            hour_prob = hour_patterns.get(target_hour, 0) / total_requests
-            probability = max(probability, hour_prob)
-        
-        return probability
+    def _frequency_probability(self, n_keys: int) -> np.ndarray:
+        """Популярность относительно самого популярного инструмента"""
+        popularity = self._current_popularity(n_keys)
+        return popularity / (popularity.max() if len(popularity) else 1.0)
     
-    def _analyze_frequency_pattern(self, key: Tuple[str, str]) -> float:
-        """Анализ паттернов частоты"""
-        total_requests = self.popular_symbols.get(key, 0)
-        if total_requests == 0:
-            return 0.0
-        
-        # Нормализуем относительно самого популярного инструмента
-        max_requests = max(self.popular_symbols.values()) if self.popular_symbols else 1
-        return total_requests / max_requests
+    def get_likely_requests(self, hours_ahead: int = 24) -> List[Tuple[Tuple[str, str], float]]:
+        """Предсказание вероятных запросов"""
+        with self._lock:
+            return self._likely_requests(hours_ahead)
+    
+    def _likely_requests(self, hours_ahead: int) -> List[Tuple[Tuple[str, str], float]]:
+        """Расчет вероятных запросов (под self._lock)"""
+        n_keys = len(self._row_keys)
+        if n_keys == 0:
+            return []
+        
+        # Часы ближайшего окна считаем один раз для всех инструментов
+        hour_idx = (datetime.now().hour + np.arange(hours_ahead)) % 24
+        
+        totals = self._totals[:n_keys]
+        freq_prob = self._frequency_probability(n_keys)
+        
+        # Дешевая верхняя оценка: доля часа в окне не больше пиковой доли за сутки.
+        # Инструменты, не проходящие порог даже по ней, не анализируем по часам окна
+        peak_share = self._hour_peak[:n_keys] / totals if hours_ahead > 0 else 0.0
+        upper_bound = peak_share * 0.6 + freq_prob * 0.4
+        candidates = np.flatnonzero(upper_bound > LIKELY_REQUEST_THRESHOLD)
+        if len(candidates) == 0:
+            return []
+        
+        # Точные вероятности - только для оставшихся строк матрицы гистограмм
+        combined = _score(self._hour_matrix[candidates], totals[candidates],
+                          freq_prob[candidates], hour_idx)
+        passed = combined > LIKELY_REQUEST_THRESHOLD
+        candidates, combined = candidates[passed], combined[passed]
+        
+        # Топ-10 без полной сортировки
+        if len(candidates) > 10:
+            top = np.argpartition(-combined, 10)[:10]
+            candidates, combined = candidates[top], combined[top]
+        order = np.argsort(-combined, kind='stable')
+        
+        return [(self._row_keys[i], float(p)) for i, p in zip(candidates[order], combined[order])]
     
     def _start_prediction_engine(self):
         """Запуск движка предсказаний"""
         def prediction_worker():
-            while True:
+            while not self._stop.is_set():
                 try:
+                    self._accesses_since_run = 0
                     self._execute_predictions()
-                    time_module.sleep(1800)  # Каждые 30 минут
                 except Exception as e:
                     logger.error(f"Ошибка в движке предсказаний: {e}")
-                    time_module.sleep(300)
+                    self._stop.wait(PREDICTION_RETRY_DELAY)
+                    continue
+                
+                # Ждем таймер (каждые 30 минут), всплеск обращений или остановку
+                self._wake.wait(timeout=PREDICTION_INTERVAL)
+                self._wake.clear()
         
         thread = threading.Thread(target=prediction_worker, daemon=True)
         thread.start()
     
+    def shutdown(self):
+        """Остановка движка предсказаний"""
+        self._stop.set()
+        self._wake.set()
+    
     def _execute_predictions(self):
         """Выполнение предсказаний и предзагрузки"""
         likely_requests = self.get_likely_requests(hours_ahead=6)
@@ -136,15 +225,14 @@ class SmartPredictor:
 
     # ДОБАВЛЕННЫЕ МЕТОДЫ ДЛЯ GUI:
     
-    def get_popular_symbols(self, top_n: int = 10) -> List[Tuple[Tuple[str, str], int]]:
+    def get_popular_symbols(self, top_n: int = 10) -> List[Tuple[Tuple[str, str], float]]:
         """Возвращает самые популярные инструменты"""
-        # Сортируем по количеству обращений и берем топ-N
-        sorted_symbols = sorted(
-            self.popular_symbols.items(), 
-            key=lambda x: x[1], 
-            reverse=True
-        )
-        return sorted_symbols[:top_n]
+        # Топ-N по затухающему счетчику обращений без полной сортировки
+        with self._lock:
+            n_keys = len(self._row_keys)
+            popularity = self._current_popularity(n_keys).tolist()
+            keys = self._row_keys[:n_keys]
+        return heapq.nlargest(top_n, zip(keys, popularity), key=itemgetter(1))
     
     def get_prediction_stats(self) -> Dict[str, Any]:
         """Статистика предсказаний"""
@@ -155,5 +243,5 @@ class SmartPredictor:
             'successful_predictions': self.successful_predictions,
             'prediction_accuracy': accuracy / 100,  # В долях для форматирования
             'access_patterns_count': len(self.access_patterns),
-            'popular_symbols_count': len(self.popular_symbols)
+            'popular_symbols_count': len(self._row_keys)
         }
\ No newline at end of file
@@ -4,22 +4,54 @@
 ИСПРАВЛЕННАЯ ВЕРСИЯ на основе работающих примеров
 """
 
+import bisect
+import numpy as np
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 import logging
 from tinkoff.invest import Client, CandleInterval
 from tinkoff.invest.services import InstrumentsService
+import threading
 import time
+import weakref
+from .tbank_cache import TBankCache
+from .ttl_cache import ttl_cache, clear_ttl_cache
 
 logger = logging.getLogger(__name__)
 
+# FIGI тикера меняется крайне редко - держим соответствие сутки
+FIGI_CACHE_TTL = 24 * 3600
+FIGI_CACHE_SIZE = 4096
+
+# Ключ справочника инструментов в дисковом кэше
+_INSTRUMENTS_CACHE_KEY = 'tbank_api'
+
+# Колонки справочника инструментов в порядке DataFrame
+_INSTRUMENT_COLUMNS = ('symbol', 'name', 'type', 'currency', 'lot_size', 'figi', 'class_code',
+                       'min_price_increment', 'api_trade_available', 'buy_available', 'sell_available')
+
+# Явные типы колонок справочника (остальные - object)
+_COLUMN_DTYPES = {
+    'lot_size': np.int32,
+    'min_price_increment': np.float64,
+    'api_trade_available': bool,
+    'buy_available': bool,
+    'sell_available': bool,
+}
+_CATEGORY_COLUMNS = frozenset({'type', 'currency'})
+
 def quotation_to_float(quotation) -> float:
     """Конвертация Quotation в float"""
     if hasattr(quotation, 'units') and hasattr(quotation, 'nano'):
         return quotation.units + quotation.nano / 1e9
     return float(quotation)
 
+def _quotation_value(quotation) -> float:
+    """Быстрая конвертация Quotation в float без проверок (для свечей SDK)"""
+    return quotation.units + quotation.nano * 1e-9
+
 def moneyvalue_to_float(money_value) -> float:
     """Конвертация MoneyValue в float"""
     if hasattr(money_value, 'units') and hasattr(money_value, 'nano'):
@@ -29,18 +61,58 @@ def moneyvalue_to_float(money_value) -> float:
 class TBankAPI:
     """ИСПРАВЛЕННЫЙ класс для работы с Tinkoff Invest API"""
     
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, cache: TBankCache = None):
         self.api_key = api_key
-        self._figi_cache = {}  # Кэш FIGI для тикеров
+        # Дисковый кэш справочника: теплый старт без пяти запросов к API.
+        # Если не передан, создается при первом обращении к диску
+        self._cache = cache
+        self._cache_lock = threading.Lock()
+        self._disk_cache_checked = False
         self._instruments_cache = None  # Кэш всех инструментов
-        self._last_instruments_update = None
+        self._ticker_to_figi = {}  # Тикер -> FIGI первого инструмента с этим тикером
+        self._symbols_text = ''    # Все тикеры через '\n' для подстрочного поиска
+        self._symbol_offsets = []  # Позиции начала каждого тикера в _symbols_text
+        self._last_instruments_update = None  # time.monotonic() последнего обновления
         self._cache_ttl = 3600  # 1 час в секундах
         
+        self._client = None
+        self._client_finalizer = None
+        self._client_lock = threading.Lock()
+        
         if api_key:
             logger.info("✅ Tinkoff API инициализирован с ключом")
         else:
             logger.warning("⚠️ Tinkoff API без ключа - только MOEX будет доступен")
 
+    @property
+    def cache(self) -> TBankCache:
+        """Дисковый кэш справочника (каталоги кэша создаются только при первом обращении)"""
+        if self._cache is None:
+            with self._cache_lock:
+                if self._cache is None:
+                    self._cache = TBankCache()
+        return self._cache
+
+    def _ensure_client(self):
+        """Возвращает долгоживущий клиент, открывая канал при первом обращении"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    client_ctx = Client(self.api_key)
+                    self._client = client_ctx.__enter__()
+                    # Канал закроется при сборке объекта или завершении интерпретатора
+                    self._client_finalizer = weakref.finalize(
+                        self, client_ctx.__exit__, None, None, None)
+        return self._client
+
+    def close(self):
+        """Закрывает канал клиента"""
+        with self._client_lock:
+            if self._client_finalizer is not None:
+                self._client_finalizer()
+            self._client_finalizer = None
+            self._client = None
+
     def _get_instruments(self, force_refresh: bool = False) -> pd.DataFrame:
         """
         Получение списка всех инструментов с кэшированием
@@ -48,54 +120,78 @@ class TBankAPI:
         # Проверяем актуальность кэша
         if (self._instruments_cache is not None and 
             not force_refresh and
-            self._last_instruments_update and
-            (datetime.now() - self._last_instruments_update).seconds < self._cache_ttl):
+            self._last_instruments_update is not None and
+            time.monotonic() - self._last_instruments_update < self._cache_ttl):
             return self._instruments_cache
         
+        # Без ключа клиент не создать - справочник Tinkoff недоступен
         if not self.api_key:
             return pd.DataFrame()
-            
+        
+        # При первом обращении пробуем справочник, сохраненный прошлым запуском
+        if self._instruments_cache is None and not force_refresh and not self._disk_cache_checked:
+            self._disk_cache_checked = True
+            cached = self.cache.load_instruments(_INSTRUMENTS_CACHE_KEY)
+            if cached is not None and not cached.empty:
+                self._set_instruments(cached)
+                logger.info(f"✅ Справочник Tinkoff загружен с диска ({len(cached)} инструментов)")
+                return cached
+        
         try:
-            instruments_data = []
+            # Колонки собираем параллельными списками и строим DataFrame с явными типами
+            columns = {name: [] for name in _INSTRUMENT_COLUMNS}
+            # Целая и дробная части шага цены, переводятся во float одним векторным проходом
+            increment_units = []
+            increment_nanos = []
             
-            with Client(self.api_key) as client:
-                # Получаем разные типы инструментов
-                instrument_types = [
-                    ('shares', client.instruments.shares),
-                    ('bonds', client.instruments.bonds),
-                    ('etfs', client.instruments.etfs),
-                    ('currencies', client.instruments.currencies),
-                    ('futures', client.instruments.futures)
-                ]
-                
-                for instrument_type, method in instrument_types:
-                    try:
-                        response = method()
-                        for instrument in response.instruments:
-                            # Базовые проверки доступности инструмента
-                            if (instrument.ticker and instrument.ticker.strip() and 
-                                instrument.lot > 0 and instrument.min_price_increment):
-                                
-                                instruments_data.append({
-                                    'symbol': instrument.ticker,
-                                    'name': instrument.name,
-                                    'type': instrument_type,
-                                    'currency': instrument.currency,
-                                    'lot_size': instrument.lot,
-                                    'figi': instrument.figi,
-                                    'class_code': instrument.class_code,
-                                    'min_price_increment': moneyvalue_to_float(instrument.min_price_increment),
-                                    'api_trade_available': instrument.api_trade_available_flag,
-                                    'buy_available': instrument.buy_available_flag,
-                                    'sell_available': instrument.sell_available_flag
-                                })
-                    except Exception as e:
-                        logger.warning(f"Ошибка загрузки {instrument_type}: {e}")
-                        continue
+            client = self._ensure_client()
+            # Получаем разные типы инструментов
+            instrument_types = [
+                ('shares', client.instruments.shares),
+                ('bonds', client.instruments.bonds),
+                ('etfs', client.instruments.etfs),
+                ('currencies', client.instruments.currencies),
+                ('futures', client.instruments.futures)
+            ]
             
-            df = pd.DataFrame(instruments_data)
-            self._instruments_cache = df
-            self._last_instruments_update = datetime.now()
+            # Типы запрашиваем параллельно, а разбираем в исходном порядке
+            with ThreadPoolExecutor(max_workers=len(instrument_types)) as executor:
+                futures = [(instrument_type, executor.submit(method))
+                           for instrument_type, method in instrument_types]
+            
+            for instrument_type, future in futures:
+                try:
+                    response = future.result()
+                    for instrument in response.instruments:
+                        # Базовые проверки доступности инструмента
+                        if (instrument.ticker and instrument.ticker.strip() and 
+                            instrument.lot > 0 and instrument.min_price_increment):
+                            
+                            columns['symbol'].append(instrument.ticker)
+                            columns['name'].append(instrument.name)
+                            columns['type'].append(instrument_type)
+                            columns['currency'].append(instrument.currency)
+                            columns['lot_size'].append(instrument.lot)
+                            columns['figi'].append(instrument.figi)
+                            columns['class_code'].append(instrument.class_code)
+                            columns['api_trade_available'].append(instrument.api_trade_available_flag)
+                            columns['buy_available'].append(instrument.buy_available_flag)
+                            columns['sell_available'].append(instrument.sell_available_flag)
+                            increment_units.append(instrument.min_price_increment.units)
+                            increment_nanos.append(instrument.min_price_increment.nano)
+                except Exception as e:
+                    logger.warning(f"Ошибка загрузки {instrument_type}: {e}")
+                    continue
+            
+            columns['min_price_increment'] = (np.asarray(increment_units, dtype=np.int64) +
+                                              np.asarray(increment_nanos, dtype=np.int64) * 1e-9)
+            df = pd.DataFrame({
+                name: (pd.Categorical(values) if name in _CATEGORY_COLUMNS else
+                       np.asarray(values, dtype=_COLUMN_DTYPES.get(name, object)))
+                for name, values in columns.items()
+            })
+            self._set_instruments(df)
+            self.cache.save_instruments(df, _INSTRUMENTS_CACHE_KEY)
             
             logger.info(f"✅ Загружено {len(df)} инструментов Tinkoff")
             return df
@@ -104,6 +200,14 @@ class TBankAPI:
             logger.error(f"❌ Ошибка получения инструментов Tinkoff: {e}")
             return pd.DataFrame()
 
+    def _set_instruments(self, df: pd.DataFrame):
+        """Установка справочника в память вместе с индексами поиска FIGI"""
+        self._instruments_cache = df
+        # Обратный порядок: при повторе тикера остается первый инструмент
+        self._ticker_to_figi = dict(zip(df['symbol'].iloc[::-1], df['figi'].iloc[::-1]))
+        self._build_symbol_search_index(df['symbol'].tolist())
+        self._last_instruments_update = time.monotonic()
+
     def get_instruments_list(self, instrument_type: str = None) -> pd.DataFrame:
         """
         Получение списка доступных инструментов с фильтрацией
@@ -125,36 +229,51 @@ class TBankAPI:
         
         return df
 
+    @ttl_cache(FIGI_CACHE_TTL, maxsize=FIGI_CACHE_SIZE, cache_none=False)
     def _get_figi_by_ticker(self, ticker: str) -> Optional[str]:
         """
         Получение FIGI по тикеру с кэшированием
-        """
-        # Проверяем кэш
-        if ticker in self._figi_cache:
-            return self._figi_cache[ticker]
         
+        Кэшируются только найденные FIGI: None может означать временную
+        недоступность справочника, и такой тикер проверяется повторно.
+        """
         instruments_df = self._get_instruments()
         if instruments_df.empty:
             return None
         
         # Ищем точное совпадение тикера
-        match = instruments_df[instruments_df['symbol'] == ticker]
-        if not match.empty:
-            figi = match.iloc[0]['figi']
-            self._figi_cache[ticker] = figi
+        figi = self._ticker_to_figi.get(ticker)
+        if figi is not None:
             return figi
         
-        # Если точного совпадения нет, ищем похожие
-        similar = instruments_df[instruments_df['symbol'].str.contains(ticker, na=False)]
-        if not similar.empty:
-            figi = similar.iloc[0]['figi']
-            self._figi_cache[ticker] = figi
-            logger.info(f"Найден похожий тикер: {similar.iloc[0]['symbol']} для запроса {ticker}")
-            return figi
+        # Если точного совпадения нет, ищем первый тикер, содержащий запрос
+        row = self._find_symbol_containing(ticker)
+        if row is not None:
+            logger.info(f"Найден похожий тикер: {instruments_df['symbol'].iat[row]} для запроса {ticker}")
+            return instruments_df['figi'].iat[row]
         
         logger.warning(f"Инструмент с тикером {ticker} не найден")
         return None
 
+    def _build_symbol_search_index(self, symbols: List[str]):
+        """Подготовка подстрочного поиска по тикерам: одна строка и позиции тикеров"""
+        offsets = []
+        position = 0
+        for symbol in symbols:
+            offsets.append(position)
+            position += len(symbol) + 1
+        self._symbols_text = '\n'.join(symbols)
+        self._symbol_offsets = offsets
+
+    def _find_symbol_containing(self, query: str) -> Optional[int]:
+        """Номер строки первого тикера, содержащего query (поиск str.find по общей строке)"""
+        if not query or '\n' in query:
+            return None
+        position = self._symbols_text.find(query)
+        if position < 0:
+            return None
+        return bisect.bisect_right(self._symbol_offsets, position) - 1
+
     def get_historical_data(self, symbol: str, 
                           start_date: str, 
                           end_date: str = None,
@@ -196,38 +315,39 @@ class TBankAPI:
             
             logger.info(f"Запрос данных Tinkoff для {symbol} с {from_time} по {to_time}, таймфрейм: {timeframe}")
             
-            # Получаем свечи
-            candles = []
-            with Client(self.api_key) as client:
-                for candle in client.get_all_candles(
-                    figi=figi,
-                    from_=from_time,
-                    to=to_time,
-                    interval=interval
-                ):
-                    candles.append({
-                        'date': candle.time,
-                        'open': quotation_to_float(candle.open),
-                        'high': quotation_to_float(candle.high),
-                        'low': quotation_to_float(candle.low),
-                        'close': quotation_to_float(candle.close),
-                        'volume': candle.volume,
-                        'figi': figi,
-                        'symbol': symbol
-                    })
+            # Получаем свечи сразу по колонкам
+            dates, opens, highs, lows, closes, volumes = [], [], [], [], [], []
+            to_float = _quotation_value  # SDK всегда отдает Quotation в OHLC свечей
+            client = self._ensure_client()
+            for candle in client.get_all_candles(
+                figi=figi,
+                from_=from_time,
+                to=to_time,
+                interval=interval
+            ):
+                dates.append(candle.time)
+                opens.append(to_float(candle.open))
+                highs.append(to_float(candle.high))
+                lows.append(to_float(candle.low))
+                closes.append(to_float(candle.close))
+                volumes.append(candle.volume)
             
-            if not candles:
+            if not dates:
                 logger.warning(f"Нет данных Tinkoff для {symbol} за период {start_date} - {end_date}")
                 return pd.DataFrame()
             
-            df = pd.DataFrame(candles)
-            df.set_index('date', inplace=True)
-            df.sort_index(inplace=True)
-            
-            # Убедимся, что все числовые колонки имеют правильный тип
-            numeric_cols = ['open', 'high', 'low', 'close', 'volume']
-            for col in numeric_cols:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
+            # Числовые колонки сразу нужного типа - без последующего pd.to_numeric
+            df = pd.DataFrame({
+                'open': np.asarray(opens, dtype=np.float64),
+                'high': np.asarray(highs, dtype=np.float64),
+                'low': np.asarray(lows, dtype=np.float64),
+                'close': np.asarray(closes, dtype=np.float64),
+                'volume': np.asarray(volumes, dtype=np.int64),
+                'figi': figi,
+                'symbol': symbol
+            }, index=pd.DatetimeIndex(dates, name='date'))
+            if not df.index.is_monotonic_increasing:
+                df.sort_index(inplace=True)
             
             logger.info(f"✅ Загружено {len(df)} свечей Tinkoff для {symbol}")
             return df
@@ -236,50 +356,83 @@ class TBankAPI:
             logger.error(f"❌ Ошибка получения данных Tinkoff для {symbol}: {e}")
             return pd.DataFrame()
 
-    def get_current_quotes(self, symbols: List[str]) -> pd.DataFrame:
+    def get_current_quotes(self, symbols: List[str], with_order_book: bool = True) -> pd.DataFrame:
         """
         Получение текущих котировок
+        
+        Последние цены всех инструментов запрашиваются одним вызовом get_last_prices.
+        Лучшие цены покупки/продажи берутся из стаканов, которые запрашиваются
+        параллельно. Если bid/ask/spread не нужны, with_order_book=False пропускает
+        запросы стаканов, и эти колонки заполняются NaN.
         """
         if not self.api_key:
             logger.error("API ключ не установлен")
             return pd.DataFrame()
             
         try:
-            quotes_data = []
+            resolved = []  # (тикер, FIGI)
+            for symbol in symbols:
+                figi = self._get_figi_by_ticker(symbol)
+                if not figi:
+                    logger.warning(f"Не найден FIGI для {symbol}")
+                    continue
+                resolved.append((symbol, figi))
+            
+            if not resolved:
+                return pd.DataFrame()
+            
+            order_books = {}
+            client = self._ensure_client()
+            # Последние цены - одним запросом на все инструменты
+            response = client.market_data.get_last_prices(figi=[figi for _, figi in resolved])
+            last_prices = {price.figi: quotation_to_float(price.price) for price in response.last_prices}
             
-            with Client(self.api_key) as client:
-                for symbol in symbols:
-                    figi = self._get_figi_by_ticker(symbol)
-                    if not figi:
-                        logger.warning(f"Не найден FIGI для {symbol}")
-                        continue
-                    
+            if with_order_book:
+                with ThreadPoolExecutor(max_workers=min(8, len(resolved))) as executor:
+                    futures = {figi: executor.submit(client.market_data.get_order_book, figi=figi, depth=1)
+                               for _, figi in resolved}
+                for symbol, figi in resolved:
                     try:
-                        # Получаем стакан цен
-                        order_book = client.market_data.get_order_book(figi=figi, depth=1)
-                        
-                        # Получаем последнюю цену
-                        last_price = quotation_to_float(order_book.last_price)
-                        
-                        # Получаем лучшие цены покупки/продажи
-                        best_bid = quotation_to_float(order_book.bids[0].price) if order_book.bids else last_price
-                        best_ask = quotation_to_float(order_book.asks[0].price) if order_book.asks else last_price
-                        
-                        quotes_data.append({
-                            'symbol': symbol,
-                            'last': last_price,
-                            'bid': best_bid,
-                            'ask': best_ask,
-                            'spread': abs(best_ask - best_bid) if best_ask and best_bid else 0,
-                            'timestamp': datetime.now(),
-                            'figi': figi
-                        })
-                        
+                        order_books[figi] = futures[figi].result()
                     except Exception as e:
-                        logger.warning(f"Не удалось получить котировку для {symbol}: {e}")
-                        continue
+                        logger.warning(f"Не удалось получить стакан для {symbol}: {e}")
             
-            df = pd.DataFrame(quotes_data)
+            # Колонки котировок собираем списками и превращаем в массивы один раз
+            symbols_col, figis_col, last_col, bid_col, ask_col = [], [], [], [], []
+            for symbol, figi in resolved:
+                if figi not in last_prices:
+                    logger.warning(f"Не удалось получить котировку для {symbol}")
+                    continue
+                
+                last_price = last_prices[figi]
+                best_bid = best_ask = np.nan
+                
+                order_book = order_books.get(figi)
+                if order_book is not None:
+                    # Получаем лучшие цены покупки/продажи
+                    best_bid = quotation_to_float(order_book.bids[0].price) if order_book.bids else last_price
+                    best_ask = quotation_to_float(order_book.asks[0].price) if order_book.asks else last_price
+                
+                symbols_col.append(symbol)
+                figis_col.append(figi)
+                last_col.append(last_price)
+                bid_col.append(best_bid)
+                ask_col.append(best_ask)
+            
+            bid = np.asarray(bid_col, dtype=np.float64)
+            ask = np.asarray(ask_col, dtype=np.float64)
+            # Спред одним выражением: нулевая цена с любой стороны дает нулевой спред
+            spread = np.where((bid == 0) | (ask == 0), 0.0, np.abs(ask - bid))
+            
+            df = pd.DataFrame({
+                'symbol': symbols_col,
+                'last': np.asarray(last_col, dtype=np.float64),
+                'bid': bid,
+                'ask': ask,
+                'spread': spread,
+                'timestamp': pd.Timestamp(datetime.now()),
+                'figi': figis_col
+            })
             logger.info(f"✅ Загружены котировки для {len(df)} инструментов Tinkoff")
             return df
             
@@ -296,13 +449,14 @@ class TBankAPI:
             return False
             
         try:
-            with Client(self.api_key) as client:
-                # Простой запрос для проверки подключения
-                accounts = client.users.get_accounts()
-                logger.info("✅ Подключение к Tinkoff API успешно")
-                return True
+            client = self._ensure_client()
+            # Простой запрос для проверки подключения
+            accounts = client.users.get_accounts()
+            logger.info("✅ Подключение к Tinkoff API успешно")
+            return True
         except Exception as e:
             logger.error(f"❌ Ошибка подключения к Tinkoff API: {e}")
+            self.close()  # Следующий запрос откроет канал заново
             return False
 
     def is_available(self) -> bool:
@@ -311,8 +465,11 @@ class TBankAPI:
 
     def clear_cache(self):
         """Очистка кэшей"""
-        self._figi_cache.clear()
+        clear_ttl_cache(self)  # Кэш FIGI для тикеров
         self._instruments_cache = None
+        self._ticker_to_figi = {}
+        self._symbols_text = ''
+        self._symbol_offsets = []
         self._last_instruments_update = None
         logger.info("✅ Кэши Tinkoff API очищены")
 
@@ -324,22 +481,22 @@ class TBankAPI:
             return {}
             
         try:
-            with Client(self.api_key) as client:
-                accounts = client.users.get_accounts()
-                accounts_info = []
-                
-                for account in accounts.accounts:
-                    accounts_info.append({
-                        'id': account.id,
-                        'type': account.type.name,
-                        'status': account.status.name,
-                        'name': account.name
-                    })
-                
-                return {
-                    'accounts': accounts_info,
-                    'total_accounts': len(accounts.accounts)
-                }
+            client = self._ensure_client()
+            accounts = client.users.get_accounts()
+            accounts_info = []
+            
+            for account in accounts.accounts:
+                accounts_info.append({
+                    'id': account.id,
+                    'type': account.type.name,
+                    'status': account.status.name,
+                    'name': account.name
+                })
+            
+            return {
+                'accounts': accounts_info,
+                'total_accounts': len(accounts.accounts)
+            }
                 
         except Exception as e:
             logger.error(f"Ошибка получения информации о счетах: {e}")
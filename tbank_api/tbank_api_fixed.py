@@ -4,16 +4,31 @@
 ОБНОВЛЕННАЯ ВЕРСИЯ - использует исправленный основной класс
 """
 
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from datetime import datetime, timedelta, time as dt_time
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
 import logging
+import time
 
 # Импортируем исправленный основной класс
 from .tbank_api import TBankAPI, quotation_to_float
 
 logger = logging.getLogger(__name__)
 
+# Пустой ответ get_instrument_info: тоже только для чтения, как и найденные записи
+_EMPTY_INFO = MappingProxyType({})
+
+# Время работы основной сессии MOEX и обеденного перерыва
+_MARKET_OPEN = dt_time(10, 0)
+_MARKET_CLOSE = dt_time(18, 40)
+_LUNCH_START = dt_time(14, 0)
+_LUNCH_END = dt_time(14, 3)
+
+# Сколько секунд держим результат проверки открытости рынка
+MARKET_STATUS_TTL = 1.0
+
 class TBankAPIFixed:
     """
     Улучшенный класс для работы с Tinkoff Invest API
@@ -31,6 +46,36 @@ class TBankAPIFixed:
         """
         self.api = TBankAPI(api_key)  # Используем исправленный основной класс
         self._additional_cache = {}  # Дополнительный кэш для специфичных данных
+        # Отсортированный список инструментов и индекс тикер -> строка,
+        # перестраиваются только при обновлении справочника основного класса
+        self._instruments_source = None
+        self._instruments_df = None
+        self._symbol_index = {}
+        # Тикеры и названия в нижнем регистре для поиска без регулярных выражений
+        self._symbols_lower = None
+        self._names_lower = None
+        # Последняя проверка открытости рынка: (время monotonic, результат)
+        self._market_status = (None, False)
+        
+    def _get_symbol_index(self) -> Tuple[pd.DataFrame, Dict[str, int]]:
+        """
+        Список торгуемых инструментов и индекс тикер -> номер строки
+        
+        Справочник основного класса меняется только при обновлении, поэтому
+        фильтрация, сортировка и индекс строятся один раз на его версию.
+        """
+        source = self.api._get_instruments()
+        if source is not self._instruments_source or self._instruments_df is None:
+            df = self.api.get_instruments_list()
+            symbols = df['symbol'].tolist() if not df.empty else []
+            # Обратный порядок: при повторе тикера остается первая строка
+            self._symbol_index = dict(zip(reversed(symbols), range(len(symbols) - 1, -1, -1)))
+            if not df.empty:
+                self._symbols_lower = np.char.lower(df['symbol'].fillna('').to_numpy(dtype=str))
+                self._names_lower = np.char.lower(df['name'].fillna('').to_numpy(dtype=str))
+            self._instruments_df = df
+            self._instruments_source = source
+        return self._instruments_df, self._symbol_index
         
     def get_instruments_list(self, instrument_type: str = None) -> pd.DataFrame:
         """
@@ -111,7 +156,7 @@ class TBankAPIFixed:
         """
         return self.api.is_available()
     
-    def get_instrument_info(self, symbol: str) -> Dict:
+    def get_instrument_info(self, symbol: str) -> Mapping:
         """
         ДОПОЛНИТЕЛЬНЫЙ МЕТОД: Получение детальной информации об инструменте
         
@@ -122,23 +167,20 @@ class TBankAPIFixed:
             
         Returns:
         --------
-        Dict
-            Словарь с информацией об инструменте
+        Mapping
+            Словарь с информацией об инструменте (только для чтения)
         """
         cache_key = f"info_{symbol}"
         if cache_key in self._additional_cache:
-            return self._additional_cache[cache_key].copy()
+            return self._additional_cache[cache_key]
         
         try:
-            instruments_df = self.api.get_instruments_list()
-            if instruments_df.empty:
-                return {}
-            
-            instrument_data = instruments_df[instruments_df['symbol'] == symbol]
-            if instrument_data.empty:
-                return {}
+            instruments_df, symbol_index = self._get_symbol_index()
+            row = symbol_index.get(symbol)
+            if row is None:
+                return _EMPTY_INFO
             
-            info = instrument_data.iloc[0].to_dict()
+            info = instruments_df.iloc[row].to_dict()
             
             # Добавляем дополнительную информацию
             info['available_for_trading'] = (
@@ -147,14 +189,15 @@ class TBankAPIFixed:
                 info.get('sell_available', False)
             )
             
-            # Сохраняем в кэш
-            self._additional_cache[cache_key] = info.copy()
+            # В кэше храним неизменяемое представление и отдаем его без копирования
+            info = MappingProxyType(info)
+            self._additional_cache[cache_key] = info
             
             return info
             
         except Exception as e:
             logger.error(f"Ошибка получения информации об инструменте {symbol}: {e}")
-            return {}
+            return _EMPTY_INFO
     
     def get_portfolio_data(self) -> pd.DataFrame:
         """
@@ -208,17 +251,17 @@ class TBankAPIFixed:
             DataFrame с найденными инструментами
         """
         try:
-            instruments_df = self.api.get_instruments_list(instrument_type)
+            instruments_df, _ = self._get_symbol_index()
             if instruments_df.empty:
                 return pd.DataFrame()
             
-            # Поиск по тикеру и названию
-            mask = (
-                instruments_df['symbol'].str.contains(query, case=False, na=False) |
-                instruments_df['name'].str.contains(query, case=False, na=False)
-            )
+            # Поиск подстроки по тикеру и названию - по заранее приведенным к нижнему регистру массивам
+            q = query.lower()
+            mask = (np.char.find(self._symbols_lower, q) >= 0) | (np.char.find(self._names_lower, q) >= 0)
+            if instrument_type and instrument_type != 'all':
+                mask &= instruments_df['type'].to_numpy() == instrument_type
             
-            results = instruments_df[mask]
+            results = instruments_df.iloc[np.flatnonzero(mask)]
             logger.info(f"Найдено {len(results)} инструментов по запросу '{query}'")
             
             return results
@@ -256,15 +299,12 @@ class TBankAPIFixed:
             Результаты валидации
         """
         try:
-            instruments_df = self.api.get_instruments_list()
-            if instruments_df.empty:
+            instruments_df, symbol_index = self._get_symbol_index()
+            row = symbol_index.get(symbol)
+            if row is None:
                 return {'exists': False, 'tradable': False}
             
-            instrument_data = instruments_df[instruments_df['symbol'] == symbol]
-            if instrument_data.empty:
-                return {'exists': False, 'tradable': False}
-            
-            info = instrument_data.iloc[0]
+            info = instruments_df.iloc[row]
             tradable = (
                 info.get('api_trade_available', False) and
                 info.get('buy_available', False) and
@@ -307,26 +347,33 @@ class TBankAPIFixed:
     def _is_market_open_now(self) -> bool:
         """
         Проверка, открыт ли рынок в текущий момент
+        
+        Результат переиспользуется в течение MARKET_STATUS_TTL секунд.
         """
-        now = datetime.now()
+        checked_at, is_open = self._market_status
+        now_monotonic = time.monotonic()
+        if checked_at is not None and now_monotonic - checked_at < MARKET_STATUS_TTL:
+            return is_open
         
+        is_open = self._check_market_hours(datetime.now())
+        self._market_status = (now_monotonic, is_open)
+        return is_open
+    
+    @staticmethod
+    def _check_market_hours(now: datetime) -> bool:
+        """Попадает ли момент в торговую сессию"""
         # Проверяем день недели (пн-пт)
         if now.weekday() >= 5:  # 5=суббота, 6=воскресенье
             return False
         
-        # Проверяем время
         current_time = now.time()
-        market_open = datetime.strptime('10:00', '%H:%M').time()
-        market_close = datetime.strptime('18:40', '%H:%M').time()
-        lunch_start = datetime.strptime('14:00', '%H:%M').time()
-        lunch_end = datetime.strptime('14:03', '%H:%M').time()
         
         # Проверяем общее время работы
-        if not (market_open <= current_time <= market_close):
+        if not (_MARKET_OPEN <= current_time <= _MARKET_CLOSE):
             return False
         
         # Проверяем обеденный перерыв
-        if lunch_start <= current_time <= lunch_end:
+        if _LUNCH_START <= current_time <= _LUNCH_END:
             return False
         
         return True
@@ -337,6 +384,11 @@ class TBankAPIFixed:
         """
         self.api.clear_cache()
         self._additional_cache.clear()
+        self._instruments_source = None
+        self._instruments_df = None
+        self._symbol_index = {}
+        self._symbols_lower = None
+        self._names_lower = None
         logger.info("✅ Все кэши TBankAPIFixed очищены")
     
     def get_api_stats(self) -> Dict:
@@ -5,20 +5,81 @@
 
 import pandas as pd
 import json
+import re
+import shutil
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Optional, Any, Union
 import logging
 from .cache_config import CacheConfig
 
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+    logging.debug("pyarrow не установлен. Свечи будут сохраняться через pandas.")
+
 logger = logging.getLogger(__name__)
 
+# Колонка времени свечи в датасете и имя индекса при чтении (как в TBankAPI)
+_TIMESTAMP_COLUMN = 'timestamp'
+_CANDLES_INDEX_NAME = 'date'
+# Колонки секционирования внутри каталога figi=/timeframe=
+_PARTITION_COLUMNS = ['year', 'month']
+# Даты периода в конце имени файла свечей: ..._YYYYMMDD_YYYYMMDD
+_PERIOD_RE = re.compile(r'_(\d{4})(\d{2})(\d{2})_(\d{4})(\d{2})(\d{2})$')
+# Кодеки parquet, принимающие уровень сжатия (snappy и lz4 его не поддерживают)
+_LEVELED_CODECS = frozenset({'zstd', 'gzip', 'brotli'})
+# Потоков для параллельного чтения файлов периодов (чтение parquet отпускает GIL)
+_PERIOD_READ_WORKERS = 8
+
+def _time_bound(value: datetime, timestamp_type) -> 'pa.Scalar':
+    """Граница фильтра по времени в типе колонки (с учетом часового пояса)"""
+    bound = pd.Timestamp(value)
+    tz = getattr(timestamp_type, 'tz', None)
+    if tz is not None and bound.tzinfo is None:
+        bound = bound.tz_localize(tz)
+    elif tz is None and bound.tzinfo is not None:
+        bound = bound.tz_convert(None)
+    return pa.scalar(bound, type=timestamp_type)
+
+def _merge_candles(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Объединение отсортированных по времени кусков свечей
+    
+    Дубликаты определяются по времени свечи (индексу), при совпадении остается
+    строка из более позднего куска. Куски обычно идут по возрастанию, поэтому
+    сортировка нужна редко и выполняется устойчивым mergesort по почти
+    упорядоченным данным.
+    """
+    combined = pd.concat(frames, copy=False)
+    if combined.index.has_duplicates:
+        combined = combined[~combined.index.duplicated(keep='last')]
+    if not combined.index.is_monotonic_increasing:
+        combined = combined.sort_index(kind='mergesort')
+    return combined
+
 class TBankCache:
     """Кэширование данных Tinkoff API с поддержкой инкрементального обновления"""
     
     def __init__(self, config: CacheConfig = None):
         self.config = config or CacheConfig()
-        self._memory_cache = {}  # Быстрый кэш в памяти
+        self._memory_cache = OrderedDict()  # Быстрый кэш в памяти (LRU, свежие записи в конце)
+        # Последний подсчет файлов кэша: (время monotonic, статистика)
+        self._file_stats = None
+        # Метаданные всех записей - в одном SQLite-файле, соединение открывается при первом обращении
+        self._metadata_conn = None
+        self._metadata_lock = threading.Lock()
         
     # ===== КЭШИРОВАНИЕ ИНСТРУМЕНТОВ =====
     
@@ -35,7 +96,8 @@ class TBankCache:
                 cache_path,
                 engine='pyarrow',
                 compression=self.config.compression,
-                index=False
+                index=False,
+                **self._parquet_write_options(self.config.compression)
             )
             
             # Сохраняем метаданные
@@ -47,9 +109,9 @@ class TBankCache:
             }
             self._save_metadata(f"instruments_{instrument_type}", metadata)
             
-            # Сохраняем в memory cache
+            # Сохраняем в memory cache без копирования: кэшированный справочник не изменяется
             cache_key = f"instruments_{instrument_type}"
-            self._memory_cache[cache_key] = instruments_df.copy()
+            self._remember(cache_key, instruments_df)
             
             logger.info(f"✅ Инструменты типа '{instrument_type}' сохранены в кэш ({len(instruments_df)} записей)")
             return True
@@ -59,8 +121,14 @@ class TBankCache:
             return False
     
     def load_instruments(self, instrument_type: str = "all", 
-                        force_refresh: bool = False) -> Optional[pd.DataFrame]:
-        """Загрузка списка инструментов из кэша"""
+                        force_refresh: bool = False,
+                        copy_on_read: bool = False) -> Optional[pd.DataFrame]:
+        """
+        Загрузка списка инструментов из кэша
+        
+        Из memory cache возвращается общий DataFrame - его нельзя изменять на месте.
+        Вызывающим, которым нужна изменяемая копия, следует передать copy_on_read=True.
+        """
         if not self.config.cache_enabled:
             return None
             
@@ -68,7 +136,9 @@ class TBankCache:
         cache_key = f"instruments_{instrument_type}"
         if not force_refresh and cache_key in self._memory_cache:
             logger.debug(f"Инструменты загружены из memory cache: {instrument_type}")
-            return self._memory_cache[cache_key].copy()
+            self._memory_cache.move_to_end(cache_key)
+            instruments_df = self._memory_cache[cache_key]
+            return instruments_df.copy() if copy_on_read else instruments_df
         
         cache_path = self.config.get_instrument_cache_path(instrument_type)
         
@@ -85,10 +155,10 @@ class TBankCache:
             instruments_df = pd.read_parquet(cache_path)
             
             # Сохраняем в memory cache
-            self._memory_cache[cache_key] = instruments_df.copy()
+            self._remember(cache_key, instruments_df)
             
             logger.info(f"✅ Инструменты загружены из кэша: {instrument_type} ({len(instruments_df)} записей)")
-            return instruments_df
+            return instruments_df.copy() if copy_on_read else instruments_df
             
         except Exception as e:
             logger.error(f"❌ Ошибка загрузки инструментов из кэша: {e}")
@@ -109,13 +179,22 @@ class TBankCache:
             
             cache_path = self.config.get_candle_cache_path(figi, timeframe, date_str)
             
-            # Сохраняем данные
-            candles_df.to_parquet(
-                cache_path,
-                engine='pyarrow',
-                compression=self.config.compression,
-                index=True  # Индекс - это дата
-            )
+            # Сохраняем данные (индекс - это дата)
+            if self._use_candles_dataset():
+                self._write_candles_dataset(figi, timeframe, candles_df)
+            elif self._use_arrow_io():
+                table = pa.Table.from_pandas(candles_df, preserve_index=True)
+                pq.write_table(table, cache_path,
+                               compression=self.config.candles_compression,
+                               **self._parquet_write_options(self.config.candles_compression))
+            else:
+                candles_df.to_parquet(
+                    cache_path,
+                    engine='pyarrow',
+                    compression=self.config.compression,
+                    index=True,
+                    **self._parquet_write_options(self.config.compression)
+                )
             
             # Сохраняем метаданные
             metadata = {
@@ -137,22 +216,38 @@ class TBankCache:
     
     def load_candles(self, figi: str, timeframe: str, 
                     start_date: datetime, end_date: datetime) -> Optional[pd.DataFrame]:
-        """Загрузка свечей из кэша"""
+        """
+        Загрузка свечей из кэша
+        
+        Ключ периода хранит только даты, поэтому в режиме датасета возвращаются
+        все свечи с дня start_date по день end_date включительно - в том числе
+        сохраненные другими периодами. Свечи позже дня end_date не возвращаются,
+        даже если были записаны вместе с этим периодом (файл на период отдавал
+        их целиком).
+        """
         if not self.config.cache_enabled:
             return None
             
         date_str = f"{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}"
         cache_path = self.config.get_candle_cache_path(figi, timeframe, date_str)
+        use_dataset = self._use_candles_dataset()
         
-        if not cache_path.exists():
+        if not use_dataset and not cache_path.exists():
             return None
             
-        # Проверка актуальности кэша
+        # Проверка актуальности кэша (метаданные периода пишутся и для датасета)
         if not self._is_cache_valid(f"candles_{figi}_{timeframe}_{date_str}", self.config.candles_ttl):
             return None
         
         try:
-            candles_df = pd.read_parquet(cache_path)
+            if use_dataset:
+                # Период адресуется целыми днями - конец включаем до конца дня end_date
+                end_bound = pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1)
+                candles_df = self._read_candles_dataset(figi, timeframe, pd.Timestamp(start_date).normalize(), end_bound)
+                if candles_df.empty:
+                    return None
+            else:
+                candles_df = self._read_candles_file(cache_path)
             logger.info(f"✅ Свечи загружены из кэша: {figi} ({timeframe}) - {len(candles_df)} записей")
             return candles_df
             
@@ -167,15 +262,16 @@ class TBankCache:
         
         periods = []
         for file_path in cache_files:
+            # Извлекаем даты из имени файла без разбора формата strptime
+            match = _PERIOD_RE.search(file_path.stem)
+            if match is None:
+                continue
             try:
-                # Извлекаем даты из имени файла
-                filename = file_path.stem
-                date_part = filename.split('_')[-2:]  # Последние две части - даты
-                if len(date_part) == 2:
-                    start_date = datetime.strptime(date_part[0], '%Y%m%d')
-                    end_date = datetime.strptime(date_part[1], '%Y%m%d')
-                    periods.append((start_date, end_date, file_path))
-            except Exception as e:
+                parts = [int(part) for part in match.groups()]
+                start_date = datetime(*parts[:3])
+                end_date = datetime(*parts[3:])
+                periods.append((start_date, end_date, file_path))
+            except ValueError as e:
                 logger.warning(f"Не удалось обработать файл кэша {file_path}: {e}")
         
         return periods
@@ -188,6 +284,14 @@ class TBankCache:
         if new_candles_df.empty:
             return new_candles_df
         
+        if self._use_candles_dataset():
+            # Перезаписываются только месяцы, в которые попали новые свечи
+            start_date = new_candles_df.index.min()
+            end_date = new_candles_df.index.max()
+            self.save_candles(figi, timeframe, new_candles_df, (start_date, end_date))
+            logger.info(f"✅ Кэш свечей обновлен инкрементально: {figi} ({timeframe})")
+            return self._read_candles_dataset(figi, timeframe)
+        
         # Находим существующие кэшированные периоды
         cached_periods = self.find_cached_candle_periods(figi, timeframe)
         
@@ -198,21 +302,12 @@ class TBankCache:
             self.save_candles(figi, timeframe, new_candles_df, (start_date, end_date))
             return new_candles_df
         
-        # Объединяем с существующими данными
-        all_candles = []
-        for start, end, cache_path in cached_periods:
-            try:
-                cached_data = pd.read_parquet(cache_path)
-                all_candles.append(cached_data)
-            except Exception as e:
-                logger.warning(f"Ошибка загрузки кэша {cache_path}: {e}")
+        # Объединяем с существующими данными: периоды по возрастанию начала, новые свечи - последними
+        cached_periods.sort(key=itemgetter(0))
+        all_candles = self._read_period_files([cache_path for _, _, cache_path in cached_periods])
         
         if all_candles:
-            # Объединяем все кэшированные данные
-            combined_cached = pd.concat(all_candles).drop_duplicates().sort_index()
-            
-            # Объединяем с новыми данными
-            combined_all = pd.concat([combined_cached, new_candles_df]).drop_duplicates().sort_index()
+            combined_all = _merge_candles(all_candles + [new_candles_df])
             
             # Сохраняем обновленный кэш
             start_date = combined_all.index.min()
@@ -226,12 +321,130 @@ class TBankCache:
     
     # ===== ВСПОМОГАТЕЛЬНЫЕ МЕТОДЫ =====
     
+    def _use_arrow_io(self) -> bool:
+        """Работать со свечами напрямую через pyarrow"""
+        return PYARROW_AVAILABLE and self.config.use_arrow_io
+    
+    def _remember(self, cache_key: str, value: Any):
+        """Запись в memory cache с вытеснением давно не использованных записей"""
+        self._memory_cache[cache_key] = value
+        self._memory_cache.move_to_end(cache_key)
+        while len(self._memory_cache) > self.config.memory_cache_max_entries:
+            self._memory_cache.popitem(last=False)
+    
+    def _parquet_write_options(self, compression: str) -> Dict[str, Any]:
+        """Общие параметры записи parquet: уровень сжатия (если кодек его принимает), словарь, размер страницы"""
+        options = {
+            'use_dictionary': True,
+            'data_page_size': self.config.parquet_page_size,
+        }
+        if compression and compression.lower() in _LEVELED_CODECS:
+            options['compression_level'] = self.config.compression_level
+        return options
+    
+    def _use_candles_dataset(self) -> bool:
+        """Хранить свечи секционированным датасетом pyarrow"""
+        return PYARROW_AVAILABLE and self.config.use_candles_dataset
+    
+    def _write_candles_dataset(self, figi: str, timeframe: str, candles_df: pd.DataFrame):
+        """
+        Запись свечей в датасет с секциями по году и месяцу
+        
+        Затронутые месяцы дочитываются, объединяются с новыми свечами (новые
+        побеждают при совпадении времени) и перезаписываются целиком; остальные
+        секции не трогаются.
+        """
+        first, last = candles_df.index.min(), candles_df.index.max()
+        month_start = first.normalize().replace(day=1)
+        month_end = last.normalize().replace(day=1) + pd.offsets.MonthBegin(1)
+        
+        existing = self._read_candles_dataset(figi, timeframe, month_start, month_end)
+        if not existing.empty:
+            candles_df = _merge_candles([existing, candles_df])
+        
+        frame = candles_df.rename_axis(_TIMESTAMP_COLUMN).reset_index()
+        timestamps = frame[_TIMESTAMP_COLUMN].dt
+        frame['year'] = timestamps.year.astype('int16')
+        frame['month'] = timestamps.month.astype('int8')
+        
+        ds.write_dataset(
+            pa.Table.from_pandas(frame, preserve_index=False),
+            base_dir=str(self.config.get_candles_dataset_path(figi, timeframe)),
+            format='parquet',
+            partitioning=_PARTITION_COLUMNS,
+            partitioning_flavor='hive',
+            basename_template='part-{i}.parquet',
+            existing_data_behavior='delete_matching',
+            file_options=ds.ParquetFileFormat().make_write_options(
+                compression=self.config.candles_compression,
+                **self._parquet_write_options(self.config.candles_compression))
+        )
+    
+    def _read_candles_dataset(self, figi: str, timeframe: str,
+                              start: pd.Timestamp = None, end: pd.Timestamp = None) -> pd.DataFrame:
+        """Чтение свечей из датасета за полуинтервал [start, end) с фильтром на стороне pyarrow"""
+        dataset_path = self.config.get_candles_dataset_path(figi, timeframe)
+        if not dataset_path.exists():
+            return pd.DataFrame()
+        
+        dataset = ds.dataset(str(dataset_path), format='parquet', partitioning='hive')
+        timestamp_type = dataset.schema.field(_TIMESTAMP_COLUMN).type
+        
+        condition = None
+        if start is not None:
+            condition = ds.field(_TIMESTAMP_COLUMN) >= _time_bound(start, timestamp_type)
+        if end is not None:
+            before_end = ds.field(_TIMESTAMP_COLUMN) < _time_bound(end, timestamp_type)
+            condition = before_end if condition is None else condition & before_end
+        
+        columns = [name for name in dataset.schema.names if name not in _PARTITION_COLUMNS]
+        table = dataset.to_table(columns=columns, filter=condition)
+        
+        candles_df = table.to_pandas(self_destruct=True, use_threads=True).set_index(_TIMESTAMP_COLUMN)
+        candles_df.index.name = _CANDLES_INDEX_NAME
+        if not candles_df.index.is_monotonic_increasing:
+            candles_df.sort_index(inplace=True)
+        return candles_df
+    
+    def _read_period_files(self, cache_paths: List[Path]) -> List[pd.DataFrame]:
+        """Параллельное чтение файлов периодов; нечитаемые файлы пропускаются"""
+        frames = []
+        with ThreadPoolExecutor(max_workers=min(_PERIOD_READ_WORKERS, len(cache_paths))) as executor:
+            futures = [executor.submit(self._read_candles_file, path) for path in cache_paths]
+            for cache_path, future in zip(cache_paths, futures):
+                try:
+                    frames.append(future.result())
+                except Exception as e:
+                    logger.warning(f"Ошибка загрузки кэша {cache_path}: {e}")
+        return frames
+    
+    def _read_candles_file(self, cache_path: Path) -> pd.DataFrame:
+        """Чтение файла свечей"""
+        if self._use_arrow_io():
+            return pq.read_table(cache_path).to_pandas(self_destruct=True, use_threads=True)
+        return pd.read_parquet(cache_path)
+    
+    def _metadata_db(self) -> sqlite3.Connection:
+        """Соединение с реестром метаданных (создается один раз на экземпляр)"""
+        if self._metadata_conn is None:
+            conn = sqlite3.connect(str(self.config.metadata_db_path),
+                                   isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta "
+                         "(key TEXT PRIMARY KEY, cached_at TEXT NOT NULL, blob TEXT NOT NULL)")
+            self._metadata_conn = conn
+            weakref.finalize(self, conn.close)
+        return self._metadata_conn
+    
     def _save_metadata(self, key: str, metadata: Dict[str, Any]) -> bool:
         """Сохранение метаданных кэша"""
         try:
-            metadata_path = self.config.get_metadata_path(key)
-            with open(metadata_path, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, indent=2, ensure_ascii=False)
+            blob = json.dumps(metadata, ensure_ascii=False)
+            with self._metadata_lock:
+                self._metadata_db().execute(
+                    "INSERT OR REPLACE INTO meta(key, cached_at, blob) VALUES (?, ?, ?)",
+                    (key, metadata.get('cached_at', ''), blob))
             return True
         except Exception as e:
             logger.error(f"Ошибка сохранения метаданных {key}: {e}")
@@ -240,22 +453,26 @@ class TBankCache:
     def _load_metadata(self, key: str) -> Optional[Dict[str, Any]]:
         """Загрузка метаданных кэша"""
         try:
-            metadata_path = self.config.get_metadata_path(key)
-            if metadata_path.exists():
-                with open(metadata_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+            with self._metadata_lock:
+                row = self._metadata_db().execute(
+                    "SELECT blob FROM meta WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                return json.loads(row[0])
         except Exception as e:
             logger.error(f"Ошибка загрузки метаданных {key}: {e}")
         return None
     
     def _is_cache_valid(self, cache_key: str, ttl: timedelta) -> bool:
         """Проверка актуальности кэша"""
-        metadata = self._load_metadata(cache_key)
-        if not metadata or 'cached_at' not in metadata:
-            return False
-        
         try:
-            cached_at = datetime.fromisoformat(metadata['cached_at'])
+            # Для проверки достаточно времени записи - JSON не разбираем
+            with self._metadata_lock:
+                row = self._metadata_db().execute(
+                    "SELECT cached_at FROM meta WHERE key = ?", (cache_key,)).fetchone()
+            if row is None or not row[0]:
+                return False
+            
+            cached_at = datetime.fromisoformat(row[0])
             return (datetime.now() - cached_at) < ttl
         except Exception:
             return False
@@ -273,29 +490,50 @@ class TBankCache:
                 # Очистка кэша свечей
                 for file in self.config.candles_cache_dir.glob("*.parquet"):
                     file.unlink()
+                shutil.rmtree(self.config.candles_dataset_dir, ignore_errors=True)
+                self.config.candles_dataset_dir.mkdir(parents=True, exist_ok=True)
                 logger.info("✅ Кэш свечей очищен")
             
             # Очистка memory cache
             self._memory_cache.clear()
+            self._file_stats = None
             
         except Exception as e:
             logger.error(f"❌ Ошибка очистки кэша: {e}")
     
     def get_cache_stats(self) -> Dict[str, Any]:
         """Статистика кэша"""
-        stats = {
-            'instruments_cache_size': len(list(self.config.instruments_cache_dir.glob("*.parquet"))),
-            'candles_cache_size': len(list(self.config.candles_cache_dir.glob("*.parquet"))),
-            'memory_cache_entries': len(self._memory_cache),
-            'total_cache_size_mb': self._get_total_cache_size()
-        }
+        stats = dict(self._get_file_stats())
+        stats['memory_cache_entries'] = len(self._memory_cache)
         return stats
     
-    def _get_total_cache_size(self) -> float:
-        """Общий размер кэша в мегабайтах"""
+    def _get_file_stats(self) -> Dict[str, Any]:
+        """
+        Число файлов и общий размер кэша
+        
+        Каталоги обходятся одним проходом и не чаще stats_refresh_interval -
+        между пересчетами возвращается последний результат.
+        """
+        now = time.monotonic()
+        refresh_seconds = self.config.stats_refresh_interval.total_seconds()
+        if self._file_stats is not None and now - self._file_stats[0] < refresh_seconds:
+            return self._file_stats[1]
+        
+        counts = []
         total_size = 0
-        for cache_dir in [self.config.instruments_cache_dir, self.config.candles_cache_dir]:
-            for file in cache_dir.glob("**/*"):
+        for cache_dir in (self.config.instruments_cache_dir, self.config.candles_cache_dir):
+            parquet_files = 0
+            # Датасет свечей лежит внутри каталога свечей и учитывается тем же обходом
+            for file in cache_dir.rglob("*"):
                 if file.is_file():
                     total_size += file.stat().st_size
-        return total_size / (1024 * 1024)  # Convert to MB
\ No newline at end of file
+                    parquet_files += file.suffix == '.parquet'
+            counts.append(parquet_files)
+        
+        stats = {
+            'instruments_cache_size': counts[0],
+            'candles_cache_size': counts[1],
+            'total_cache_size_mb': total_size / (1024 * 1024)
+        }
+        self._file_stats = (now, stats)
+        return stats
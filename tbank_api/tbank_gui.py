@@ -313,7 +313,7 @@ class TBankApiTab:
             if popular_symbols:
                 prediction_text += f"\n\n🏆 ПОПУЛЯРНЫЕ ИНСТРУМЕНТЫ:"
                 for i, ((symbol, timeframe), count) in enumerate(popular_symbols[:3]):
-                    prediction_text += f"\n{i+1}. {symbol} ({timeframe}) - {count} обращений"
+                    prediction_text += f"\n{i+1}. {symbol} ({timeframe}) - {count:.1f} обращений"
             
             messagebox.showinfo("AI Предсказания", prediction_text)
             
@@ -323,7 +323,7 @@ class TBankApiTab:
     def toggle_auto_optimization(self):
         """Включить/выключить автооптимизацию"""
         try:
-            current_state = self.data_loader.data_manager.auto_optimizer.config['optimization_enabled']
+            current_state = self.data_loader.data_manager.auto_optimizer.config.optimization_enabled
             new_state = not current_state
             
             # Обновляем конфигурацию
@@ -385,10 +385,10 @@ class TBankApiTab:
             # Текущие настройки оптимизации
             config = self.data_loader.data_manager.auto_optimizer.config
             history_text += f"⚙️ ТЕКУЩИЕ НАСТРОЙКИ:\n"
-            history_text += f"• Автооптимизация: {'ВКЛ' if config['optimization_enabled'] else 'ВЫКЛ'}\n"
-            history_text += f"• Автоочистка: {'ВКЛ' if config['auto_cleanup_enabled'] else 'ВЫКЛ'}\n"
-            history_text += f"• Порог очистки: {config['cleanup_threshold_mb']} MB\n"
-            history_text += f"• Макс. размер: {config['max_cache_size_mb']} MB\n"
+            history_text += f"• Автооптимизация: {'ВКЛ' if config.optimization_enabled else 'ВЫКЛ'}\n"
+            history_text += f"• Автоочистка: {'ВКЛ' if config.auto_cleanup_enabled else 'ВЫКЛ'}\n"
+            history_text += f"• Порог очистки: {config.cleanup_threshold_mb} MB\n"
+            history_text += f"• Макс. размер: {config.max_cache_size_mb} MB\n"
             
             messagebox.showinfo("История оптимизаций", history_text)
             
@@ -457,18 +457,7 @@ class TBankApiTab:
                 self.log_error("Не удалось загрузить инструменты")
                 return
             
-            # Очищаем таблицу
-            for item in self.instruments_tree.get_children():
-                self.instruments_tree.delete(item)
-            
-            # Заполняем таблицу
-            for _, instrument in instruments_df.iterrows():
-                self.instruments_tree.insert('', tk.END, values=(
-                    instrument.get('symbol', ''),
-                    instrument.get('name', ''),
-                    instrument.get('type', ''),
-                    instrument.get('currency', '')
-                ))
+            self._fill_instruments_tree(instruments_df)
             
             self.available_instruments = instruments_df
             self.log_info(f"✅ Загружено {len(instruments_df)} инструментов")
@@ -476,6 +465,21 @@ class TBankApiTab:
         except Exception as e:
             self.log_error(f"Ошибка загрузки инструментов: {str(e)}")
     
+    def _fill_instruments_tree(self, instruments_df):
+        """Заполнение таблицы инструментов"""
+        # Очищаем таблицу
+        for item in self.instruments_tree.get_children():
+            self.instruments_tree.delete(item)
+        
+        # Позиции колонок вычисляем один раз и обходим строки кортежами без построения Series
+        columns = {name: i for i, name in enumerate(instruments_df.columns)}
+        positions = [columns.get(name) for name in ('symbol', 'name', 'type', 'currency')]
+        
+        for row in instruments_df.itertuples(index=False, name=None):
+            self.instruments_tree.insert('', tk.END, values=tuple(
+                row[i] if i is not None else '' for i in positions
+            ))
+    
     def search_instruments(self, query):
         """Поиск инструментов"""
         if not query:
@@ -492,18 +496,8 @@ class TBankApiTab:
             
             filtered_instruments = self.available_instruments[mask]
             
-            # Очищаем таблицу
-            for item in self.instruments_tree.get_children():
-                self.instruments_tree.delete(item)
-            
             # Заполняем таблицу отфильтрованными данными
-            for _, instrument in filtered_instruments.iterrows():
-                self.instruments_tree.insert('', tk.END, values=(
-                    instrument.get('symbol', ''),
-                    instrument.get('name', ''),
-                    instrument.get('type', ''),
-                    instrument.get('currency', '')
-                ))
+            self._fill_instruments_tree(filtered_instruments)
             
             self.log_info(f"🔍 Найдено {len(filtered_instruments)} инструментов по запросу '{query}'")
             
@@ -1029,10 +1023,10 @@ class TBankApiTab:
             settings_text = f"""⚙️ НАСТРОЙКИ ПАМЯТИ И ОПТИМИЗАЦИИ
 
             Текущие настройки:
-            • Автоочистка: {'ВКЛ' if config['auto_cleanup_enabled'] else 'ВЫКЛ'}
-            • Порог очистки: {config['cleanup_threshold_mb']} MB
-            • Макс. размер кэша: {config['max_cache_size_mb']} MB
-            • Минимальный Hit Ratio: {config['min_hit_ratio_for_cleanup']}%
+            • Автоочистка: {'ВКЛ' if config.auto_cleanup_enabled else 'ВЫКЛ'}
+            • Порог очистки: {config.cleanup_threshold_mb} MB
+            • Макс. размер кэша: {config.max_cache_size_mb} MB
+            • Минимальный Hit Ratio: {config.min_hit_ratio_for_cleanup}%
 
             Рекомендации для текущей системы:
             • Порог очистки: 500-1000 MB
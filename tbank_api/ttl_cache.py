@@ -0,0 +1,104 @@
+# tbank_api/ttl_cache.py
+"""
+Кэширование результатов методов с ограниченным временем жизни
+"""
+
+import functools
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+# Защищает создание кэшей методов в экземпляре
+_STATE_LOCK = threading.Lock()
+# Разделитель позиционных и именованных аргументов в ключе кэша
+_KWARGS_MARK = object()
+
+
+class _MethodCache:
+    """Записи кэша одного метода одного экземпляра"""
+
+    __slots__ = ('lock', 'entries', 'key_locks')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # ключ -> (время monotonic, результат), старые записи в начале
+        self.key_locks = {}           # ключ -> блокировка вычисления промаха
+
+
+def _method_cache(instance: Any, name: str) -> _MethodCache:
+    """Кэш метода в экземпляре (создается при первом обращении)"""
+    caches = instance.__dict__.get('_ttl_cache')
+    cache = caches.get(name) if caches is not None else None
+    if cache is None:
+        with _STATE_LOCK:
+            cache = instance.__dict__.setdefault('_ttl_cache', {}).setdefault(name, _MethodCache())
+    return cache
+
+
+def ttl_cache(ttl: float, maxsize: Optional[int] = None, cache_none: bool = True):
+    """
+    Декоратор для кэширования результатов метода на ttl секунд
+
+    Кэш хранится в экземпляре, поэтому сервисы с разными токенами
+    не разделяют данные между собой. Кэш потокобезопасен: одновременные
+    промахи по одному ключу вычисляются один раз, остальные потоки ждут результат.
+
+    Parameters:
+    -----------
+    ttl : float
+        Время жизни записи кэша в секундах
+    maxsize : int, optional
+        Максимальное число записей метода (по умолчанию без ограничения),
+        при переполнении вытесняется самая старая запись
+    cache_none : bool
+        Кэшировать ли результат None. Для методов, где None означает
+        временную ошибку (нет сети или токена), следует передать False
+    """
+    def decorator(func: Callable) -> Callable:
+        def lookup(cache: _MethodCache, key: tuple):
+            with cache.lock:
+                entry = cache.entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < ttl:
+                return entry
+            return None
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs) -> Any:
+            key = args + (_KWARGS_MARK,) + tuple(sorted(kwargs.items())) if kwargs else args
+            cache = _method_cache(self, func.__name__)
+
+            entry = lookup(cache, key)
+            if entry is not None:
+                return entry[1]
+
+            with cache.lock:
+                key_lock = cache.key_locks.setdefault(key, threading.RLock())
+            try:
+                with key_lock:
+                    # Пока ждали, результат мог вычислить другой поток
+                    entry = lookup(cache, key)
+                    if entry is not None:
+                        return entry[1]
+
+                    result = func(self, *args, **kwargs)
+                    if result is None and not cache_none:
+                        return result
+                    with cache.lock:
+                        cache.entries[key] = (time.monotonic(), result)
+                        cache.entries.move_to_end(key)
+                        if maxsize is not None:
+                            while len(cache.entries) > maxsize:
+                                cache.entries.popitem(last=False)
+                    return result
+            finally:
+                with cache.lock:
+                    cache.key_locks.pop(key, None)
+        return wrapper
+    return decorator
+
+
+def clear_ttl_cache(instance: Any):
+    """Сбрасывает все записи TTL-кэша экземпляра"""
+    with _STATE_LOCK:
+        instance.__dict__.pop('_ttl_cache', None)
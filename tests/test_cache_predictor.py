@@ -0,0 +1,64 @@
+# tests/test_cache_predictor.py
+"""
+Тесты count-min sketch и набора кандидатов CachePredictor
+"""
+
+import pytest
+
+try:
+    from tbank_api import cache_predictor
+except ImportError as e:  # Пакет требует numpy, pandas и tinkoff-investments
+    pytest.skip(f"tbank_api недоступен: {e}", allow_module_level=True)
+
+
+@pytest.fixture
+def predictor():
+    return cache_predictor.CachePredictor(cache_manager=None)
+
+
+def test_sketch_indexes_are_stable_ints_within_width():
+    indexes = cache_predictor.CachePredictor._sketch_indexes(('SBER', '1d'))
+
+    assert len(indexes) == cache_predictor._CMS_DEPTH
+    assert all(isinstance(i, int) and 0 <= i < cache_predictor._CMS_WIDTH for i in indexes)
+    assert indexes == cache_predictor.CachePredictor._sketch_indexes(('SBER', '1d'))
+
+
+def test_frequency_estimate_counts_accesses(predictor):
+    for _ in range(7):
+        predictor.record_access('SBER', '1d')
+    predictor.record_access('GAZP', '1d')
+
+    # Count-min sketch может только переоценить частоту
+    assert predictor._estimate_frequency(('SBER', '1d')) >= 7
+    assert predictor.get_popular_symbols(1) == [(('SBER', '1d'), 7)]
+
+
+def test_candidates_are_bounded(predictor):
+    for i in range(cache_predictor._MAX_CANDIDATES * 2):
+        predictor.record_access(f'T{i}', '1h')
+    for _ in range(5):
+        predictor.record_access('SBER', '1d')
+
+    assert len(predictor.popular_symbols) == cache_predictor._MAX_CANDIDATES
+    assert predictor.get_popular_symbols(1)[0][0] == ('SBER', '1d')
+
+
+def test_sketch_ages_on_overflow(predictor, monkeypatch):
+    monkeypatch.setattr(cache_predictor, '_CMS_MAX', 8)
+    for _ in range(20):
+        predictor.record_access('SBER', '1d')
+
+    # После сброса счетчики уменьшаются вдвое и не переполняются
+    assert max(max(row) for row in predictor._cms) <= 8
+    assert predictor.get_popular_symbols(1)[0][0] == ('SBER', '1d')
+
+
+def test_preload_candidates_merge_popular_and_recent(predictor):
+    for _ in range(3):
+        predictor.record_access('SBER', '1d')
+    predictor.record_access('GAZP', '1d')
+
+    candidates = dict(predictor.get_preload_candidates(top_n=1))
+
+    assert set(candidates) == {('SBER', '1d'), ('GAZP', '1d')}
@@ -0,0 +1,89 @@
+# tests/test_moex_api.py
+"""
+Тесты разбора ответов ISS и котировок MoexAPI без обращения к сети
+"""
+
+import json
+import time
+
+import pytest
+
+try:
+    import numpy as np
+    from tbank_api import moex_api
+except ImportError as e:  # Пакет требует numpy, pandas и tinkoff-investments
+    pytest.skip(f"tbank_api недоступен: {e}", allow_module_level=True)
+
+
+@pytest.fixture
+def api():
+    return moex_api.MoexAPI()
+
+
+class _Response:
+    """Ответ requests с готовым JSON-телом"""
+
+    def __init__(self, payload):
+        self.content = json.dumps(payload).encode()
+
+    def raise_for_status(self):
+        pass
+
+
+def _quote(symbol, last):
+    return (symbol, last, 0, 0, None)
+
+
+def test_quotes_follow_requested_order(api, monkeypatch):
+    # GAZP уже в кэше, остальные приходят по бордам в своем порядке
+    api._quote_cache['GAZP'] = (time.monotonic(), _quote('GAZP', 150.0))
+    monkeypatch.setattr(api, '_request_quotes',
+                        lambda groups: [_quote('IMOEX', 3000.0), _quote('SBER', 250.0)])
+
+    quotes = api.get_current_quotes(['SBER', 'GAZP', 'IMOEX'])
+
+    assert quotes['symbol'].tolist() == ['SBER', 'GAZP', 'IMOEX']
+    assert quotes['last'].tolist() == [250.0, 150.0, 3000.0]
+
+
+def test_quotes_skip_symbols_without_data(api, monkeypatch):
+    monkeypatch.setattr(api, '_request_quotes', lambda groups: [_quote('SBER', 250.0)])
+
+    quotes = api.get_current_quotes(['UNKNOWN', 'SBER'])
+
+    assert quotes['symbol'].tolist() == ['SBER']
+
+
+def test_parse_quotes_uses_column_names():
+    data = {'marketdata': {
+        'columns': ['VOLTODAY', 'SECID', 'LASTCHANGE', 'OFFER', 'LAST'],
+        'data': [[1000, 'SBER', 1.5, 251.0, 250.0],
+                 [0, 'GAZP', None, 151.0, None]],
+    }}
+
+    quotes = moex_api.MoexAPI._parse_quotes(data)
+
+    # Цена - LAST, а без сделок - лучшая заявка OFFER
+    assert [quote[:4] for quote in quotes] == [('SBER', 250.0, 1.5, 1000), ('GAZP', 151.0, 0, 0)]
+
+
+def test_parse_quotes_without_secid_is_empty():
+    assert moex_api.MoexAPI._parse_quotes({'marketdata': {'columns': ['LAST'], 'data': [[1.0]]}}) == []
+
+
+def test_candles_follow_column_order_of_response(api, monkeypatch):
+    payload = {'candles': {
+        'columns': ['begin', 'volume', 'close', 'low', 'high', 'open'],
+        'data': [['2024-01-09 00:00:00', 300, 273.12, 270.5, 274.0, 271.01],
+                 ['2024-01-10 00:00:00', 200, 274.5, 272.0, 275.25, 273.3]],
+    }}
+    monkeypatch.setattr(api.session, 'get', lambda *args, **kwargs: _Response(payload))
+
+    candles = api.get_historical_data('SBER', '2024-01-09', '2024-01-10', timeframe='D')
+
+    assert candles.index.tolist() == [moex_api.pd.Timestamp('2024-01-09'), moex_api.pd.Timestamp('2024-01-10')]
+    assert candles['open'].tolist() == [271.01, 273.3]
+    assert candles['close'].tolist() == [273.12, 274.5]
+    assert candles['volume'].tolist() == [300, 200]
+    # Цены без потери точности - сужение типов остается оптимизатору
+    assert candles['open'].dtype == np.float64
@@ -0,0 +1,91 @@
+# tests/test_smart_predictor.py
+"""
+Тесты матрицы часовых гистограмм SmartPredictor
+"""
+
+import threading
+from datetime import datetime
+
+import pytest
+
+try:
+    from tbank_api import smart_predictor
+except ImportError as e:  # Пакет требует numpy, pandas и tinkoff-investments
+    pytest.skip(f"tbank_api недоступен: {e}", allow_module_level=True)
+
+
+class _DummyCacheManager:
+    """Менеджер кэша, запоминающий вызовы предзагрузки"""
+
+    def __init__(self):
+        self.preloaded = []
+
+    def preload_data(self, symbol, timeframe, days_back=7):
+        self.preloaded.append((symbol, timeframe, days_back))
+        return True
+
+
+@pytest.fixture
+def predictor():
+    instance = smart_predictor.SmartPredictor(_DummyCacheManager())
+    yield instance
+    instance.shutdown()
+
+
+def test_empty_window_has_zero_time_component(predictor):
+    now = datetime.now()
+    for _ in range(5):
+        predictor.record_access('SBER', '1d', now)
+
+    # Окно нулевой длины не должно падать на пустой редукции
+    likely = predictor.get_likely_requests(hours_ahead=0)
+
+    assert likely == [(('SBER', '1d'), pytest.approx(0.4))]
+
+
+def test_current_hour_pattern_scores_high(predictor):
+    now = datetime.now()
+    for _ in range(10):
+        predictor.record_access('SBER', '1d', now)
+    predictor.record_access('GAZP', '1d', now.replace(hour=(now.hour + 12) % 24))
+
+    likely = dict(predictor.get_likely_requests(hours_ahead=1))
+
+    assert likely[('SBER', '1d')] == pytest.approx(1.0)
+    assert ('GAZP', '1d') not in likely
+
+
+def test_matrix_grows_past_initial_rows(predictor):
+    now = datetime.now()
+    n_keys = smart_predictor._INITIAL_ROWS * 2 + 1
+    for i in range(n_keys):
+        predictor.record_access(f'T{i}', '1h', now)
+
+    assert predictor.get_prediction_stats()['popular_symbols_count'] == n_keys
+    assert len(predictor.get_popular_symbols(top_n=5)) == 5
+    assert len(predictor.get_likely_requests(hours_ahead=1)) <= 10
+
+
+def test_concurrent_growth_and_scoring(predictor):
+    now = datetime.now()
+    errors = []
+
+    def writer(prefix):
+        try:
+            for i in range(smart_predictor._INITIAL_ROWS * 4):
+                predictor.record_access(f'{prefix}{i}', '1d', now)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(p,)) for p in ('A', 'B')]
+    for thread in threads:
+        thread.start()
+    # Чтение во время роста матрицы не должно ловить несогласованные размеры
+    while any(thread.is_alive() for thread in threads):
+        predictor.get_likely_requests(hours_ahead=6)
+        predictor.get_popular_symbols(top_n=5)
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert predictor.get_prediction_stats()['popular_symbols_count'] == smart_predictor._INITIAL_ROWS * 8
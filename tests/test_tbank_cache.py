@@ -0,0 +1,98 @@
+# tests/test_tbank_cache.py
+"""
+Тесты секционированного parquet-кэша свечей TBankCache
+"""
+
+from datetime import datetime
+
+import pytest
+
+try:
+    import pandas as pd
+    from tbank_api.cache_config import CacheConfig
+    from tbank_api import tbank_cache
+except ImportError as e:  # Пакет требует numpy, pandas и tinkoff-investments
+    pytest.skip(f"tbank_api недоступен: {e}", allow_module_level=True)
+
+if not tbank_cache.PYARROW_AVAILABLE:
+    pytest.skip("pyarrow не установлен", allow_module_level=True)
+
+FIGI = 'BBG004730N88'
+
+
+@pytest.fixture
+def config(tmp_path):
+    base = tmp_path / 'cache'
+    return CacheConfig(
+        base_cache_dir=base,
+        instruments_cache_dir=base / 'instruments',
+        candles_cache_dir=base / 'candles',
+        candles_dataset_dir=base / 'candles' / 'dataset',
+        metadata_dir=base / 'metadata',
+        metadata_db_path=base / 'metadata' / 'meta.db',
+    )
+
+
+@pytest.fixture
+def cache(config):
+    return tbank_cache.TBankCache(config)
+
+
+def _candles(*timestamps, close=100.0):
+    index = pd.DatetimeIndex(pd.to_datetime(list(timestamps)), name='date')
+    return pd.DataFrame({'open': close, 'high': close, 'low': close, 'close': close,
+                         'volume': 10}, index=index)
+
+
+def test_dataset_is_partitioned_by_year_and_month(cache, config):
+    candles = _candles('2024-01-31 10:00', '2024-02-01 10:00')
+    assert cache.save_candles(FIGI, '1d', candles, (datetime(2024, 1, 31), datetime(2024, 2, 1)))
+
+    dataset_dir = config.get_candles_dataset_path(FIGI, '1d')
+    assert (dataset_dir / 'year=2024' / 'month=1').is_dir()
+    assert (dataset_dir / 'year=2024' / 'month=2').is_dir()
+
+    loaded = cache.load_candles(FIGI, '1d', datetime(2024, 1, 31), datetime(2024, 2, 1))
+    assert loaded.index.tolist() == candles.index.tolist()
+    assert loaded['close'].tolist() == [100.0, 100.0]
+
+
+def test_load_returns_whole_days_of_the_period(cache):
+    candles = _candles('2024-03-01 10:00', '2024-03-05 23:00', '2024-03-06 10:00')
+    cache.save_candles(FIGI, '1h', candles, (datetime(2024, 3, 1), datetime(2024, 3, 5, 12)))
+
+    loaded = cache.load_candles(FIGI, '1h', datetime(2024, 3, 1), datetime(2024, 3, 5, 12))
+
+    # Конец периода включается до конца дня, следующий день - уже нет
+    assert loaded.index.tolist() == [pd.Timestamp('2024-03-01 10:00'), pd.Timestamp('2024-03-05 23:00')]
+
+
+def test_incremental_update_overwrites_only_matching_candles(cache):
+    cache.save_candles(FIGI, '1d', _candles('2024-04-01', '2024-04-02'),
+                       (datetime(2024, 4, 1), datetime(2024, 4, 2)))
+
+    updated = cache.update_candles_incrementally(FIGI, '1d', _candles('2024-04-02', '2024-05-01', close=200.0))
+
+    assert updated.index.tolist() == [pd.Timestamp(d) for d in ('2024-04-01', '2024-04-02', '2024-05-01')]
+    assert updated['close'].tolist() == [100.0, 200.0, 200.0]
+
+
+@pytest.mark.parametrize('codec', ['snappy', 'zstd', 'gzip'])
+def test_candles_are_written_with_any_codec(config, codec):
+    config.candles_compression = codec
+    config.compression = codec
+    cache = tbank_cache.TBankCache(config)
+    candles = _candles('2024-06-03 10:00')
+
+    # Уровень сжатия передается только кодекам, которые его принимают
+    assert cache.save_candles(FIGI, '1d', candles, (datetime(2024, 6, 3), datetime(2024, 6, 3)))
+    assert cache.load_candles(FIGI, '1d', datetime(2024, 6, 3), datetime(2024, 6, 3)) is not None
+
+
+def test_instruments_are_written_with_snappy(config):
+    config.compression = 'snappy'
+    cache = tbank_cache.TBankCache(config)
+    instruments = pd.DataFrame({'figi': [FIGI], 'symbol': ['SBER']})
+
+    assert cache.save_instruments(instruments, 'shares')
+    assert pd.read_parquet(config.get_instrument_cache_path('shares'))['symbol'].tolist() == ['SBER']
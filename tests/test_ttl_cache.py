@@ -0,0 +1,136 @@
+# tests/test_ttl_cache.py
+"""
+Тесты декоратора ttl_cache
+"""
+
+import threading
+import time
+
+import pytest
+
+try:
+    from tbank_api import ttl_cache as ttl_cache_module
+except ImportError as e:  # Пакет требует numpy, pandas и tinkoff-investments
+    pytest.skip(f"tbank_api недоступен: {e}", allow_module_level=True)
+
+ttl_cache = ttl_cache_module.ttl_cache
+clear_ttl_cache = ttl_cache_module.clear_ttl_cache
+
+
+class _Service:
+    """Сервис, считающий фактические вызовы"""
+
+    def __init__(self, result=0):
+        self.calls = 0
+        self.result = result
+
+    @ttl_cache(60, maxsize=2)
+    def lookup(self, key, scale=1):
+        self.calls += 1
+        return key * scale
+
+    @ttl_cache(60, cache_none=False)
+    def maybe(self):
+        self.calls += 1
+        return self.result
+
+    @ttl_cache(0.05)
+    def short(self):
+        self.calls += 1
+        return self.calls
+
+
+def test_hit_does_not_call_method():
+    service = _Service()
+
+    assert service.lookup(2) == 2
+    assert service.lookup(2) == 2
+    assert service.calls == 1
+
+
+def test_kwargs_are_part_of_key():
+    service = _Service()
+
+    assert service.lookup(2, scale=3) == 6
+    assert service.lookup(2) == 2
+    assert service.lookup(2, scale=3) == 6
+    assert service.calls == 2
+
+
+def test_instances_do_not_share_entries():
+    first, second = _Service(), _Service()
+
+    first.lookup(1)
+    second.lookup(1)
+
+    assert (first.calls, second.calls) == (1, 1)
+
+
+def test_expired_entry_is_recomputed():
+    service = _Service()
+
+    assert service.short() == 1
+    time.sleep(0.06)
+    assert service.short() == 2
+
+
+def test_maxsize_evicts_oldest_entry():
+    service = _Service()
+    for key in (1, 2, 3):
+        service.lookup(key)
+
+    service.lookup(3)
+    assert service.calls == 3
+    service.lookup(1)
+    assert service.calls == 4
+
+
+def test_none_is_not_cached_when_disabled():
+    service = _Service(result=None)
+
+    assert service.maybe() is None
+    assert service.maybe() is None
+    assert service.calls == 2
+
+    service.result = 5
+    assert service.maybe() == 5
+    assert service.maybe() == 5
+    assert service.calls == 3
+
+
+def test_clear_drops_all_entries():
+    service = _Service()
+    service.lookup(1)
+
+    clear_ttl_cache(service)
+    service.lookup(1)
+
+    assert service.calls == 2
+
+
+def test_concurrent_misses_compute_once():
+    started = threading.Event()
+    release = threading.Event()
+
+    class _Slow:
+        calls = 0
+
+        @ttl_cache(60)
+        def fetch(self):
+            type(self).calls += 1
+            started.set()
+            release.wait(5)
+            return 'ok'
+
+    slow = _Slow()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(slow.fetch())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    started.wait(5)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == ['ok'] * 4
+    assert _Slow.calls == 1